@@ -2,9 +2,11 @@
 Main agent for the 8051 embedded system design automation.
 """
 
+import asyncio
 import json
 import os
-from typing import Dict, List, Any, Optional
+from concurrent.futures import Executor
+from typing import Dict, List, Any, Optional, Tuple
 import traceback
 
 from langchain.agents import AgentExecutor, create_react_agent
@@ -12,6 +14,7 @@ from langchain.chains.conversation.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
 from langchain.schema import AgentAction, AgentFinish
 from langchain_community.chat_models import ChatOpenAI
+from langchain.tools import Tool
 from langchain.tools.base import BaseTool
 
 # Import custom tools
@@ -19,6 +22,55 @@ from .tools.knowledge_base import KnowledgeBaseTool
 from .tools.compiler import CompilerTool 
 from .tools.simulator import SimulatorTool
 
+# OpenAI errors worth retrying (rate limits, timeouts, connection and server
+# errors); their names differ between openai>=1.0 and the 0.28 client
+TRANSIENT_ERRORS: Tuple[type, ...] = ()
+try:
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+except ImportError:
+    try:
+        from openai.error import APIConnectionError, RateLimitError, ServiceUnavailableError, Timeout
+        TRANSIENT_ERRORS = (APIConnectionError, RateLimitError, ServiceUnavailableError, Timeout)
+    except ImportError:
+        pass
+
+# Longest error message kept in a run result
+MAX_ERROR_LENGTH = 4096
+
+
+def format_error_message(e: BaseException) -> str:
+    """Describe an exception as its type and message, cut to MAX_ERROR_LENGTH."""
+    return "".join(traceback.format_exception_only(type(e), e)).strip()[:MAX_ERROR_LENGTH]
+
+
+def create_llm(openai_api_key: Optional[str] = None, model_name: str = "gpt-4o") -> ChatOpenAI:
+    """Create the chat model used by the agent.
+    
+    Args:
+        openai_api_key: OpenAI API key.
+        model_name: Name of the model to use.
+        
+    Returns:
+        Chat model; one instance can be shared by several agents.
+    """
+    return ChatOpenAI(
+        model_name=model_name,
+        openai_api_key=openai_api_key or os.environ.get("OPENAI_API_KEY"),
+        temperature=0.1
+    )
+
+
+def _run_on_executor(tool: BaseTool, executor: Executor) -> BaseTool:
+    """Wrap a sync-only tool so async agent runs call it on the given executor.
+    
+    Without this, LangChain runs sync tools on the event loop's default executor.
+    """
+    async def arun_tool(tool_input: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(executor, tool._run, tool_input)
+    
+    return Tool(name=tool.name, description=tool.description, func=tool._run, coroutine=arun_tool)
+
 
 class EmbeddedDesignAgent:
     """Agent for automating the design of 8051 embedded systems."""
@@ -28,7 +80,9 @@ class EmbeddedDesignAgent:
         openai_api_key: Optional[str] = None,
         model_name: str = "gpt-4o",
         output_dir: str = "backend/outputs",
-        verbose: bool = False
+        verbose: bool = False,
+        llm: Optional[ChatOpenAI] = None,
+        tool_executor: Optional[Executor] = None
     ):
         """Initialize the embedded design agent.
         
@@ -37,6 +91,10 @@ class EmbeddedDesignAgent:
             model_name: Name of the model to use.
             output_dir: Directory for storing outputs.
             verbose: Whether to print verbose output.
+            llm: Chat model to use instead of creating one (e.g. shared with
+                other agents so they reuse its HTTP connections).
+            tool_executor: Executor that arun uses for tools without an async
+                implementation (by default LangChain uses the loop's default executor).
         """
         # Initialize agent components
         self.output_dir = output_dir
@@ -46,11 +104,7 @@ class EmbeddedDesignAgent:
         os.makedirs(output_dir, exist_ok=True)
         
         # Set up LLM
-        self.llm = ChatOpenAI(
-            model_name=model_name,
-            openai_api_key=openai_api_key or os.environ.get("OPENAI_API_KEY"),
-            temperature=0.1
-        )
+        self.llm = llm or create_llm(openai_api_key, model_name)
         
         # Initialize tools
         self.knowledge_tool = KnowledgeBaseTool()
@@ -62,6 +116,11 @@ class EmbeddedDesignAgent:
             self.compiler_tool,
             self.simulator_tool
         ]
+        if tool_executor is not None:
+            self.tools = [
+                tool if type(tool)._arun is not BaseTool._arun else _run_on_executor(tool, tool_executor)
+                for tool in self.tools
+            ]
         
         # Set up memory
         self.memory = ConversationBufferMemory(
@@ -83,6 +142,17 @@ class EmbeddedDesignAgent:
             max_iterations=15  # Limit number of iterations to prevent infinite loops
         )
     
+    def set_output_dir(self, output_dir: str) -> None:
+        """Write the outputs of later runs, and collect their artifacts, in output_dir.
+        
+        Giving each run its own directory keeps concurrent runs (and earlier
+        runs' leftovers) out of each other's artifacts.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.compiler_tool.output_dir = output_dir
+        self.simulator_tool.set_output_dir(output_dir)
+    
     def _create_prompt(self) -> PromptTemplate:
         """Create the prompt template for the agent."""
         template = """
@@ -139,29 +209,61 @@ Let's approach this design task step by step, making sure to explain my reasonin
         try:
             # Execute the agent - use invoke instead of run
             response = self.agent_executor.invoke({"user_request": user_request})
+            return self._format_response(response)
+        
+        except Exception as e:
+            return self._format_error(e)
+    
+    async def arun(self, user_request: str) -> Dict[str, Any]:
+        """Run the agent on a user request without blocking the event loop.
+        
+        Tools with an async implementation (the compiler and simulator) are
+        awaited, so cancelling the run kills their subprocesses; the others run
+        on the tool executor (or the loop's default executor).
+        
+        Args:
+            user_request: User's request in natural language.
             
-            # Get the response from the output
-            if isinstance(response, dict) and "output" in response:
-                agent_response = response["output"]
-            else:
-                agent_response = str(response)
-            
-            # Gather artifacts
-            artifacts = self._collect_artifacts()
-            
-            return {
-                "success": True,
-                "response": agent_response,
-                "artifacts": artifacts
-            }
+        Returns:
+            Dictionary with the agent's response and any generated artifacts.
+        """
+        try:
+            response = await self.agent_executor.ainvoke({"user_request": user_request})
+            return self._format_response(response)
         
         except Exception as e:
-            print(f"Agent execution error: {str(e)}")
-            print(traceback.format_exc())
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            return self._format_error(e)
+    
+    def _format_response(self, response: Any) -> Dict[str, Any]:
+        """Build the run result from the agent executor's output."""
+        # Get the response from the output
+        if isinstance(response, dict) and "output" in response:
+            agent_response = response["output"]
+        else:
+            agent_response = str(response)
+        
+        # Gather artifacts
+        artifacts = self._collect_artifacts()
+        
+        return {
+            "success": True,
+            "response": agent_response,
+            "artifacts": artifacts
+        }
+    
+    def _format_error(self, e: Exception) -> Dict[str, Any]:
+        """Build the run result for a failed agent execution.
+        
+        The result's "transient" flag tells callers whether retrying may help.
+        """
+        error = format_error_message(e)
+        print(f"Agent execution error: {error}")
+        print(traceback.format_exc())
+        return {
+            "success": False,
+            "error": error,
+            "transient": isinstance(e, TRANSIENT_ERRORS)
+        }
     
     def _collect_artifacts(self) -> Dict[str, str]:
         """Collect artifacts from the most recent run.
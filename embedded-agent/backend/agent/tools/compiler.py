@@ -1,10 +1,13 @@
+import asyncio
+import functools
 import os
 import subprocess
 import tempfile
 import shutil
 import glob
 import time
-from typing import Dict, Optional, List, Tuple
+from collections import namedtuple
+from typing import Any, Dict, Optional, List, Tuple
 import json
 import logging
 import traceback
@@ -19,6 +22,42 @@ try:
 except ImportError:
     HAS_ERROR_HANDLER = False
     
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+def _dumps(obj: Any) -> str:
+    """Serialize a tool response as compact JSON, using orjson when available."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+# Outcome of one SDCC invocation; its output is streamed to files rather than kept in memory
+SdccRun = namedtuple("SdccRun", "returncode stdout_path stderr_path")
+
+# SDCC and packihx run from sync code are killed after this long, so a hung one
+# can't hold its thread (e.g. an agent worker's) past the server's task timeout
+PROCESS_TIMEOUT_SECONDS = float(os.environ.get("TASK_TIMEOUT_SECONDS", 1800))
+
+
+async def _communicate(proc: asyncio.subprocess.Process, input: Optional[bytes] = None):
+    """Wait for proc like proc.communicate, killing it if the waiting task is cancelled.
+    
+    A cancelled compile (e.g. an agent run that timed out) must not leave SDCC
+    running while its temporary directory is removed.
+    """
+    try:
+        return await proc.communicate(input)
+    except asyncio.CancelledError:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -138,6 +177,41 @@ class CompilerTool(BaseTool):
         Returns:
             JSON string with compilation results and paths.
         """
+        steps = self._compile_steps(c_code)
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    compile_result = self._compile_with_sdcc(*request)
+                except Exception as e:
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(compile_result)
+        except StopIteration as done:
+            return done.value
+    
+    async def _arun(self, c_code: str = "") -> str:
+        """Compile C code like _tool_run, awaiting SDCC so the event loop stays free."""
+        steps = self._compile_steps(c_code)
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    compile_result = await self._acompile_with_sdcc(*request)
+                except Exception as e:
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(compile_result)
+        except StopIteration as done:
+            return done.value
+    
+    def _compile_steps(self, c_code: str):
+        """Drive one compilation, shared by the sync and async entry points.
+        
+        Yields ``(c_file_path, output_hex_path)`` each time SDCC has to run and
+        expects the compile result to be sent back; the JSON response is the
+        generator's return value.
+        """
         if not self.sdcc_available:
             error_msg = "SDCC compiler not found. Unable to compile code."
             logger.error(error_msg)
@@ -145,11 +219,11 @@ class CompilerTool(BaseTool):
             if HAS_ERROR_HANDLER:
                 raise CompilationError(error_msg)
             else:
-                return json.dumps({
+                return _dumps({
                     "success": False,
                     "message": "Compilation failed: SDCC not available",
                     "error": error_msg
-                }, indent=2)
+                })
 
         # Determine source file path
         c_file_path = ""
@@ -169,11 +243,11 @@ class CompilerTool(BaseTool):
                 if HAS_ERROR_HANDLER:
                     raise CompilationError(error_msg)
                 else:
-                    return json.dumps({
+                    return _dumps({
                         "success": False,
                         "message": "Compilation preparation failed",
                         "error": error_msg
-                    }, indent=2)
+                    })
 
             # Generate timestamped filename for C file
             c_filename = self._generate_versioned_filename("firmware", "c")
@@ -195,12 +269,12 @@ class CompilerTool(BaseTool):
                 if HAS_ERROR_HANDLER:
                     raise CompilationError(error_msg, code=258)  # Use code 258 for file not found
                 else:
-                    return json.dumps({
+                    return _dumps({
                         "success": False,
                         "message": "Compilation failed: No source file found",
                         "error": error_msg,
                         "error_code": 258
-                    }, indent=2)
+                    })
 
         # Define output HEX file path - use versioned naming pattern
         base_prefix = os.path.splitext(os.path.basename(c_file_path))[0].split('_')[0]
@@ -219,12 +293,12 @@ class CompilerTool(BaseTool):
 
         logger.info(f"Compiling {c_file_path} using SDCC...")
         try:
-            compile_result = self._compile_with_sdcc(c_file_path, output_hex_path)
+            compile_result = yield c_file_path, output_hex_path
             
             if not compile_result.get("success", False):
                 error_msg = compile_result.get("error", "Unknown compilation error")
                 logger.error(f"Compilation failed: {error_msg}")
-                logger.debug(f"SDCC stderr: {compile_result.get('stderr', 'No stderr output')}")
+                logger.debug(f"SDCC stderr: {compile_result.get('stderr_path') or 'No stderr output'}")
                 
                 # Handle file not found error (code 258)
                 if "No such file or directory" in error_msg and c_code:
@@ -239,7 +313,7 @@ class CompilerTool(BaseTool):
                     logger.info(f"Saved C code again to {new_c_file_path}")
                     
                     # Try compiling again
-                    compile_result = self._compile_with_sdcc(new_c_file_path, output_hex_path)
+                    compile_result = yield new_c_file_path, output_hex_path
                     
                     if not compile_result.get("success", False):
                         error_msg = compile_result.get("error", "Unknown compilation error after retry")
@@ -249,57 +323,58 @@ class CompilerTool(BaseTool):
                             raise CompilationError(
                                 error_msg, 
                                 details={
-                                    "stdout": compile_result.get("stdout", ""),
-                                    "stderr": compile_result.get("stderr", "")
+                                    "stdout_path": compile_result.get("stdout_path"),
+                                    "stderr_path": compile_result.get("stderr_path")
                                 }
                             )
                         else:
-                            return json.dumps({
+                            return _dumps({
                                 "success": False,
                                 "message": "Compilation retry failed",
                                 "error": error_msg,
                                 "data": {
-                                    "stdout": compile_result.get("stdout", ""),
-                                    "stderr": compile_result.get("stderr", "")
+                                    "stdout_path": compile_result.get("stdout_path"),
+                                    "stderr_path": compile_result.get("stderr_path")
                                 }
-                            }, indent=2)
+                            })
                 else:
                     if HAS_ERROR_HANDLER:
                         raise CompilationError(
                             error_msg, 
                             details={
-                                "stdout": compile_result.get("stdout", ""),
-                                "stderr": compile_result.get("stderr", "")
+                                "stdout_path": compile_result.get("stdout_path"),
+                                "stderr_path": compile_result.get("stderr_path")
                             }
                         )
                     else:
-                        return json.dumps({
+                        return _dumps({
                             "success": False,
                             "message": "Compilation failed",
                             "error": error_msg,
                             "data": {
-                                "stdout": compile_result.get("stdout", ""),
-                                "stderr": compile_result.get("stderr", "")
+                                "stdout_path": compile_result.get("stdout_path"),
+                                "stderr_path": compile_result.get("stderr_path")
                             }
-                        }, indent=2)
+                        })
             
             # If compilation successful, also copy to the standard firmware.hex path
             if os.path.exists(output_hex_abs_path):
-                shutil.copy(output_hex_abs_path, standard_hex_abs_path)
+                # copyfile skips the permission copy and goes through sendfile on Linux
+                shutil.copyfile(output_hex_abs_path, standard_hex_abs_path)
                 logger.info(f"Copied HEX file to standard path: {standard_hex_abs_path}")
             
             logger.info("Compilation successful")
-            return json.dumps({
+            return _dumps({
                 "success": True,
                 "message": "Compilation successful",
                 "data": {
                     "c_file_path": c_file_path,
                     "hex_file_path": output_hex_abs_path,
                     "standard_hex_path": standard_hex_abs_path,
-                    "stdout": compile_result.get("stdout", ""),
-                    "stderr": compile_result.get("stderr", "")
+                    "stdout_path": compile_result.get("stdout_path"),
+                    "stderr_path": compile_result.get("stderr_path")
                 }
-            }, indent=2)
+            })
 
         except Exception as e:
             error_msg = f"Compilation error: {str(e)}"
@@ -309,14 +384,14 @@ class CompilerTool(BaseTool):
             if HAS_ERROR_HANDLER:
                 raise CompilationError(error_msg)
             else:
-                return json.dumps({
+                return _dumps({
                     "success": False,
                     "message": "Compilation error",
                     "error": error_msg
-                }, indent=2)
+                })
 
-    def _compile_with_sdcc(self, c_file_path: str, output_hex_path: str) -> Dict:
-        """Compile C file using SDCC and generate HEX file."""
+    def _sdcc_paths(self, c_file_path: str, output_hex_path: str) -> Tuple[str, str, Optional[Dict]]:
+        """Resolve the absolute source/HEX paths, with an error result if the source is missing."""
         # Get absolute paths
         c_file_abs_path = os.path.abspath(c_file_path)
         output_hex_abs_path = os.path.abspath(output_hex_path)
@@ -329,147 +404,237 @@ class CompilerTool(BaseTool):
         if not os.path.exists(c_file_abs_path):
             error_msg = f"Source file not found: {c_file_abs_path}"
             logger.error(error_msg)
-            return {
+            return c_file_abs_path, output_hex_abs_path, {
                 "success": False,
                 "error": error_msg,
-                "stdout": "",
-                "stderr": f"Error 258: Failed to open input file '{c_file_path}' (No such file or directory)"
+                "stdout_path": None,
+                "stderr_path": None
             }
         
         # Create output directory if it doesn't exist
         output_dir = os.path.dirname(output_hex_abs_path)
         os.makedirs(output_dir, exist_ok=True)
+        return c_file_abs_path, output_hex_abs_path, None
+
+    def _compile_with_sdcc(self, c_file_path: str, output_hex_path: str) -> Dict:
+        """Compile C file using SDCC and generate HEX file."""
+        c_file_abs_path, output_hex_abs_path, error = self._sdcc_paths(c_file_path, output_hex_path)
+        if error:
+            return error
         
         # Use the original directory for compilation
         with tempfile.TemporaryDirectory() as temp_dir:
             cmd = ["sdcc", "-mmcs51", c_file_abs_path]
             logger.debug(f"Running command: {' '.join(cmd)} in {temp_dir}")
 
-            process = subprocess.run(
-                cmd, cwd=temp_dir, capture_output=True, text=True
+            stdout_path, stderr_path = self._sdcc_log_paths(output_hex_abs_path)
+            with open(stdout_path, "wb") as out, open(stderr_path, "wb") as err:
+                returncode = subprocess.run(
+                    cmd, cwd=temp_dir, stdout=out, stderr=err, timeout=PROCESS_TIMEOUT_SECONDS
+                ).returncode
+            process = SdccRun(returncode, stdout_path, stderr_path)
+            return self._collect_hex(process, c_file_abs_path, output_hex_abs_path, temp_dir)
+
+    async def _acompile_with_sdcc(self, c_file_path: str, output_hex_path: str) -> Dict:
+        """Async variant of _compile_with_sdcc that awaits SDCC instead of blocking a thread."""
+        c_file_abs_path, output_hex_abs_path, error = self._sdcc_paths(c_file_path, output_hex_path)
+        if error:
+            return error
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cmd = ["sdcc", "-mmcs51", c_file_abs_path]
+            logger.debug(f"Running command: {' '.join(cmd)} in {temp_dir}")
+
+            stdout_path, stderr_path = self._sdcc_log_paths(output_hex_abs_path)
+            with open(stdout_path, "wb") as out, open(stderr_path, "wb") as err:
+                proc = await asyncio.create_subprocess_exec(*cmd, cwd=temp_dir, stdout=out, stderr=err)
+                await _communicate(proc)
+            process = SdccRun(proc.returncode, stdout_path, stderr_path)
+            return await self._acollect_hex(process, c_file_abs_path, output_hex_abs_path, temp_dir)
+
+    @staticmethod
+    def _sdcc_log_paths(output_hex_abs_path: str) -> Tuple[str, str]:
+        """Files that receive SDCC's stdout and stderr, next to the HEX file they belong to."""
+        stem = os.path.splitext(output_hex_abs_path)[0]
+        return f"{stem}.sdcc.out", f"{stem}.sdcc.err"
+
+    def _collect_hex(
+        self,
+        process: SdccRun,
+        c_file_abs_path: str,
+        output_hex_abs_path: str,
+        temp_dir: str
+    ) -> Dict:
+        """Turn a finished SDCC run into a compile result, producing the HEX file on success."""
+        ihx_file, result = self._hex_source(process, c_file_abs_path, output_hex_abs_path, temp_dir)
+        if ihx_file is None:
+            return result
+        try:
+            packihx_process = subprocess.run(
+                ["packihx", ihx_file], 
+                capture_output=True, 
+                text=True,
+                timeout=PROCESS_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            return self._packihx_error(process, e)
+        return self._packihx_result(
+            process, output_hex_abs_path,
+            packihx_process.returncode, packihx_process.stdout, packihx_process.stderr
+        )
+
+    async def _acollect_hex(
+        self,
+        process: SdccRun,
+        c_file_abs_path: str,
+        output_hex_abs_path: str,
+        temp_dir: str
+    ) -> Dict:
+        """Async variant of _collect_hex that awaits packihx instead of blocking the event loop."""
+        ihx_file, result = self._hex_source(process, c_file_abs_path, output_hex_abs_path, temp_dir)
+        if ihx_file is None:
+            return result
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "packihx", ihx_file,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
+            stdout, stderr = await _communicate(proc)
+        except Exception as e:
+            return self._packihx_error(process, e)
+        return self._packihx_result(
+            process, output_hex_abs_path,
+            proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+        )
+
+    def _hex_source(
+        self,
+        process: SdccRun,
+        c_file_abs_path: str,
+        output_hex_abs_path: str,
+        temp_dir: str
+    ) -> Tuple[Optional[str], Optional[Dict]]:
+        """Locate SDCC's output for a finished run.
+        
+        Returns ``(ihx_file, None)`` when packihx still has to convert an IHX file
+        into the HEX file, otherwise ``(None, result)`` with the compile result.
+        """
+        logger.debug(f"SDCC return code: {process.returncode}")
+        logger.debug(f"SDCC stdout: {process.stdout_path}")
+        logger.debug(f"SDCC stderr: {process.stderr_path}")
+
+        if process.returncode == 0:
+            base_name = os.path.splitext(os.path.basename(c_file_abs_path))[0]
+            # Check for the IHX file in the current directory
+            ihx_file = f"{base_name}.ihx"
+                
+            if os.path.exists(ihx_file):
+                # Generate HEX from IHX using packihx
+                logger.info(f"Found IHX file: {ihx_file}")
+                return ihx_file, None
             
-            logger.debug(f"SDCC return code: {process.returncode}")
-            logger.debug(f"SDCC stdout: {process.stdout}")
-            logger.debug(f"SDCC stderr: {process.stderr}")
-
-            if process.returncode == 0:
-                base_name = os.path.splitext(os.path.basename(c_file_abs_path))[0]
-                # Check for the IHX file in the current directory
-                ihx_file = f"{base_name}.ihx"
+            # Check other locations for IHX/HEX files
+            ihx_files = glob.glob("*.ihx") + glob.glob(os.path.join(temp_dir, "*.ihx"))
+            hex_files = glob.glob("*.hex") + glob.glob(os.path.join(temp_dir, "*.hex"))
                 
-                if os.path.exists(ihx_file):
-                    # Generate HEX from IHX using packihx
-                    logger.info(f"Found IHX file: {ihx_file}")
-                    try:
-                        packihx_process = subprocess.run(
-                            ["packihx", ihx_file], 
-                            capture_output=True, 
-                            text=True
-                        )
-                        if packihx_process.returncode == 0:
-                            # Write packihx output to the HEX file
-                            with open(output_hex_abs_path, 'w') as f:
-                                f.write(packihx_process.stdout)
-                            logger.info(f"Generated HEX file at {output_hex_abs_path}")
-                        else:
-                            logger.error(f"packihx failed: {packihx_process.stderr}")
-                            return {
-                                "success": False,
-                                "error": f"Failed to convert IHX to HEX: {packihx_process.stderr}",
-                                "stdout": process.stdout,
-                                "stderr": process.stderr
-                            }
-                    except Exception as e:
-                        logger.error(f"Error running packihx: {str(e)}")
-                        return {
-                            "success": False,
-                            "error": f"Error converting IHX to HEX: {str(e)}",
-                            "stdout": process.stdout,
-                            "stderr": process.stderr
-                        }
-                else:
-                    # Check other locations for IHX/HEX files
-                    ihx_files = glob.glob("*.ihx") + glob.glob(os.path.join(temp_dir, "*.ihx"))
-                    hex_files = glob.glob("*.hex") + glob.glob(os.path.join(temp_dir, "*.hex"))
-                    
-                    all_hex_files = ihx_files + hex_files
-                    
-                    if all_hex_files:
-                        # Found at least one HEX/IHX file
-                        source_file = all_hex_files[0]
-                        logger.info(f"Found alternative HEX/IHX file: {source_file}")
-                        
-                        if source_file.endswith('.ihx'):
-                            # Convert IHX to HEX
-                            try:
-                                packihx_process = subprocess.run(
-                                    ["packihx", source_file], 
-                                    capture_output=True, 
-                                    text=True
-                                )
-                                if packihx_process.returncode == 0:
-                                    with open(output_hex_abs_path, 'w') as f:
-                                        f.write(packihx_process.stdout)
-                                    logger.info(f"Generated HEX file at {output_hex_abs_path}")
-                                else:
-                                    logger.error(f"packihx failed: {packihx_process.stderr}")
-                                    return {
-                                        "success": False,
-                                        "error": f"Failed to convert IHX to HEX: {packihx_process.stderr}",
-                                        "stdout": process.stdout,
-                                        "stderr": process.stderr
-                                    }
-                            except Exception as e:
-                                logger.error(f"Error running packihx: {str(e)}")
-                                return {
-                                    "success": False,
-                                    "error": f"Error converting IHX to HEX: {str(e)}",
-                                    "stdout": process.stdout,
-                                    "stderr": process.stderr
-                                }
-                        else:
-                            # Direct copy for HEX files
-                            shutil.copy(source_file, output_hex_abs_path)
-                            logger.info(f"Copied HEX file from {source_file} to {output_hex_abs_path}")
-                    else:
-                        logger.error("Compilation succeeded but no HEX/IHX file found")
-                        return {
-                            "success": False,
-                            "error": "Compilation succeeded but no HEX/IHX file found",
-                            "stdout": process.stdout,
-                            "stderr": process.stderr
-                        }
-
-                return {
-                    "success": True,
-                    "hex_file": output_hex_abs_path,
-                    "stdout": process.stdout,
-                    "stderr": process.stderr
-                }
-
-            else:
-                logger.error(f"Compilation failed with code {process.returncode}")
-                # Include details about the error in the stderr
-                error_lines = process.stderr.splitlines()
-                error_summary = "\n".join(error_lines[:10])  # First 10 lines of errors
-                if len(error_lines) > 10:
-                    error_summary += f"\n... and {len(error_lines) - 10} more errors/warnings"
+            all_hex_files = ihx_files + hex_files
                 
-                return {
+            if not all_hex_files:
+                logger.error("Compilation succeeded but no HEX/IHX file found")
+                return None, {
                     "success": False,
-                    "error": f"Compilation failed: {error_summary}",
-                    "stdout": process.stdout,
-                    "stderr": process.stderr
+                    "error": "Compilation succeeded but no HEX/IHX file found",
+                    "stdout_path": process.stdout_path,
+                    "stderr_path": process.stderr_path
                 }
+            
+            # Found at least one HEX/IHX file
+            source_file = all_hex_files[0]
+            logger.info(f"Found alternative HEX/IHX file: {source_file}")
+                
+            if source_file.endswith('.ihx'):
+                # Convert IHX to HEX
+                return source_file, None
+            
+            # Direct copy for HEX files
+            shutil.copyfile(source_file, output_hex_abs_path)
+            logger.info(f"Copied HEX file from {source_file} to {output_hex_abs_path}")
+            return None, {
+                "success": True,
+                "hex_file": output_hex_abs_path,
+                "stdout_path": process.stdout_path,
+                "stderr_path": process.stderr_path
+            }
+
+        else:
+            logger.error(f"Compilation failed with code {process.returncode}")
+            # Include details about the error in the stderr
+            with open(process.stderr_path, errors="replace") as f:
+                error_lines = f.read().splitlines()
+            error_summary = "\n".join(error_lines[:10])  # First 10 lines of errors
+            if len(error_lines) > 10:
+                error_summary += f"\n... and {len(error_lines) - 10} more errors/warnings"
+                
+            return None, {
+                "success": False,
+                "error": f"Compilation failed: {error_summary}",
+                "stdout_path": process.stdout_path,
+                "stderr_path": process.stderr_path
+            }
+
+    def _packihx_result(
+        self,
+        process: SdccRun,
+        output_hex_abs_path: str,
+        returncode: int,
+        stdout: str,
+        stderr: str
+    ) -> Dict:
+        """Write packihx's output to the HEX file and build the compile result."""
+        if returncode != 0:
+            logger.error(f"packihx failed: {stderr}")
+            return {
+                "success": False,
+                "error": f"Failed to convert IHX to HEX: {stderr}",
+                "stdout_path": process.stdout_path,
+                "stderr_path": process.stderr_path
+            }
+        
+        # Write packihx output to the HEX file
+        with open(output_hex_abs_path, 'w') as f:
+            f.write(stdout)
+        logger.info(f"Generated HEX file at {output_hex_abs_path}")
+        return {
+            "success": True,
+            "hex_file": output_hex_abs_path,
+            "stdout_path": process.stdout_path,
+            "stderr_path": process.stderr_path
+        }
+
+    def _packihx_error(self, process: SdccRun, e: Exception) -> Dict:
+        """Compile result for a packihx run that could not be started."""
+        logger.error(f"Error running packihx: {str(e)}")
+        return {
+            "success": False,
+            "error": f"Error converting IHX to HEX: {str(e)}",
+            "stdout_path": process.stdout_path,
+            "stderr_path": process.stderr_path
+        }
 
     def _run(self, c_code: str = "") -> str:
         return self._tool_run(c_code)
 
+@functools.lru_cache(maxsize=None)
+def _get_compiler() -> CompilerTool:
+    """Return the shared CompilerTool, creating it (and probing for SDCC) on first use."""
+    return CompilerTool()
+
+
 @handle_errors if HAS_ERROR_HANDLER else lambda f: f  # Apply decorator only if available
 def compile_code(c_code: str = "") -> Dict:
     """Compile 8051 C code into a HEX file."""
-    compiler_tool = CompilerTool()
+    compiler_tool = _get_compiler()
     result_json = compiler_tool._tool_run(c_code)
     return json.loads(result_json)
 
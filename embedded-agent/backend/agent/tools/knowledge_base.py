@@ -1,14 +1,46 @@
+import functools
+import hashlib
 import json
 import os
-from typing import Dict, List, Optional, Any
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
 
 import faiss
 import numpy as np
 from langchain_community.embeddings import OpenAIEmbeddings
 from langchain.tools.base import BaseTool
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.schema import Document
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Built indexes are saved under this directory (next to the KB file), one
+# subdirectory per version of the KB file
+INDEX_CACHE_DIRNAME = ".faiss_cache"
+
+# Component texts sent per embeddings request
+EMBED_CHUNK_SIZE = 512
+
+# Components returned per query
+SEARCH_K = 3
+
+@functools.lru_cache(maxsize=None)
+def _get_embeddings() -> OpenAIEmbeddings:
+    """Return the shared embeddings client, so every tool reuses one HTTP connection pool."""
+    # chunk_size packs up to EMBED_CHUNK_SIZE components into each embeddings request
+    return OpenAIEmbeddings(chunk_size=EMBED_CHUNK_SIZE)
+
+def _dumps(obj: Any) -> str:
+    """Serialize a tool response as compact JSON, using orjson when available."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
 class KnowledgeBaseTool(BaseTool):
     """Tool for retrieving component information from the knowledge base."""
     
@@ -19,6 +51,16 @@ class KnowledgeBaseTool(BaseTool):
     Returns structured information about matching components.
     """
     
+    # (key, default) pairs used to build each search result from a component
+    _RESULT_SCHEMA: ClassVar[Tuple[Tuple[str, Any], ...]] = (
+        ("type", "Unknown"),
+        ("model", "Unknown"),
+        ("description", "No description available."),
+        ("pins", []),
+        ("specifications", {}),
+        ("datasheet", "Not available"),
+    )
+    
     knowledge_base: Optional[FAISS] = None
     components_data: List[Dict[str, Any]] = []
     kb_path: str = "backend/kb/components.jsonl"
@@ -82,42 +124,92 @@ class KnowledgeBaseTool(BaseTool):
         ]
         
         os.makedirs(os.path.dirname(self.kb_path), exist_ok=True)
-        with open(self.kb_path, 'w') as f:
-            for component in example_components:
-                f.write(json.dumps(component) + '\n')
+        if HAS_ORJSON:
+            with open(self.kb_path, 'wb') as f:
+                for component in example_components:
+                    f.write(orjson.dumps(component))
+                    f.write(b'\n')
+        else:
+            with open(self.kb_path, 'w') as f:
+                for component in example_components:
+                    f.write(json.dumps(component) + '\n')
     
     def _load_components(self) -> None:
         """Load component data from the knowledge base file."""
         self.components_data = []
         try:
-            with open(self.kb_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:  # Skip empty lines
-                        self.components_data.append(json.loads(line))
+            # Read the file in one go and split it in C; orjson parses each line when available
+            with open(self.kb_path, 'rb') as f:
+                lines = f.read().splitlines()
+            loads = orjson.loads if HAS_ORJSON else json.loads
+            self.components_data = [loads(line) for line in lines if line.strip()]
         except Exception as e:
             print(f"Error loading components data: {e}")
     
+    def _index_cache_dir(self) -> str:
+        """Directory holding the saved index for the current contents of the KB file."""
+        st = os.stat(self.kb_path)
+        key = hashlib.blake2b(
+            f"{os.path.abspath(self.kb_path)}:{st.st_mtime_ns}:{st.st_size}".encode(),
+            digest_size=8
+        ).hexdigest()
+        return os.path.join(os.path.dirname(self.kb_path), INDEX_CACHE_DIRNAME, key)
+    
     def _initialize_vector_store(self) -> None:
-        """Initialize the FAISS vector store with component data."""
+        """Initialize the FAISS vector store with component data.
+        
+        The index is loaded from disk when the KB file hasn't changed since it
+        was last built, so the components are only embedded once.
+        """
         try:
-            # Create documents for FAISS
-            documents = []
-            for i, component in enumerate(self.components_data):
-                # Create a searchable text representation of the component
-                text = f"Name: {component['name']}\n"
-                text += f"Type: {component['type']}\n"
-                text += f"Subtype: {component.get('subtype', '')}\n"
-                text += f"Interface: {component.get('interface', '')}\n"
-                text += f"Notes: {component.get('notes', '')}\n"
-                
-                # Add document with metadata for retrieval
-                doc = Document(page_content=text, metadata={"index": i})
-                documents.append(doc)
+            embeddings = _get_embeddings()
+            cache_dir = self._index_cache_dir()
+            if os.path.isdir(cache_dir):
+                try:
+                    # The pickle half of the cache is only ever written by save_local below
+                    self.knowledge_base = FAISS.load_local(
+                        cache_dir,
+                        embeddings,
+                        allow_dangerous_deserialization=True,
+                        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+                    )
+                    return
+                except Exception as e:
+                    print(f"Error loading cached vector store, rebuilding: {e}")
+            
+            # Create a searchable text representation of each component
+            texts = [
+                f"Name: {component['name']}\n"
+                f"Type: {component['type']}\n"
+                f"Subtype: {component.get('subtype', '')}\n"
+                f"Interface: {component.get('interface', '')}\n"
+                f"Notes: {component.get('notes', '')}\n"
+                for component in self.components_data
+            ]
+            
+            # Create FAISS vector store. Every text is embedded in one batched
+            # call; the embedding matrix is stored as fp16 (SQfp16) to halve
+            # memory, queries stay fp32 and FAISS upcasts.
+            vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+            index = faiss.index_factory(vectors.shape[1], "SQfp16", faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.add(vectors)
             
-            # Create FAISS vector store
-            embeddings = OpenAIEmbeddings()
-            self.knowledge_base = FAISS.from_documents(documents, embeddings)
+            self.knowledge_base = FAISS(
+                embedding_function=embeddings,
+                index=index,
+                docstore=InMemoryDocstore({
+                    str(i): Document(page_content=text, metadata={"index": i})
+                    for i, text in enumerate(texts)
+                }),
+                index_to_docstore_id={i: str(i) for i in range(len(texts))},
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+            )
+            
+            try:
+                self.knowledge_base.save_local(cache_dir)
+            except OSError as e:
+                print(f"Could not cache vector store at {cache_dir}: {e}")
         except Exception as e:
             print(f"Error initializing vector store: {e}")
             self.knowledge_base = None
@@ -131,56 +223,62 @@ class KnowledgeBaseTool(BaseTool):
         Returns:
             JSON string with search results and information.
         """
+        # Take a local reference so concurrent calls never contend on instance state
+        knowledge_base = self.knowledge_base
         try:
-            if not self.knowledge_base or self.knowledge_base is None or not hasattr(self.knowledge_base, 'similarity_search'):
-                return json.dumps({
+            if not knowledge_base or getattr(knowledge_base, 'index', None) is None:
+                return _dumps({
                     "success": False,
                     "message": "Knowledge base not initialized.",
                     "error": "Knowledge base not properly loaded or initialized."
-                }, indent=2)
+                })
             
-            # 使用正确的方法名 similarity_search
-            docs = self.knowledge_base.similarity_search(query, k=3)
+            # Search the raw FAISS index; rows are added in components_data order,
+            # so each hit's id is the component's index and no Documents are built
+            query_vector = np.asarray([_get_embeddings().embed_query(query)], dtype=np.float32)
+            scores, ids = knowledge_base.index.search(query_vector, SEARCH_K)
             
             # Format the results
+            schema = self._RESULT_SCHEMA
+            components_data = self.components_data
             formatted_results = []
-            for doc in docs:
-                component_index = doc.metadata["index"]
-                component = self.components_data[component_index]
+            for score, i in zip(scores[0].tolist(), ids[0].tolist()):
+                if i < 0:  # FAISS pads with -1 when there are fewer than k components
+                    continue
+                component = components_data[i]
                 
                 # Convert component to a more readable format
-                comp_info = {
-                    "type": component.get("type", "Unknown"),
-                    "model": component.get("model", "Unknown"),
-                    "description": component.get("description", "No description available."),
-                    "pins": component.get("pins", []),
-                    "specifications": component.get("specifications", {}),
-                    "datasheet": component.get("datasheet", "Not available"),
-                    "relevance_score": doc.metadata.get("score", 0.0)
-                }
+                comp_info = {key: component.get(key, default) for key, default in schema}
+                comp_info["relevance_score"] = score
                 formatted_results.append(comp_info)
             
-            return json.dumps({
+            return _dumps({
                 "success": True,
                 "message": f"Found {len(formatted_results)} results for query: {query}",
                 "data": {
                     "query": query,
                     "results": formatted_results
                 }
-            }, indent=2)
+            })
             
         except Exception as e:
-            return json.dumps({
+            return _dumps({
                 "success": False,
                 "message": "Error searching knowledge base.",
                 "error": str(e)
-            }, indent=2)
+            })
     
     # For compatibility with langchain newer versions
     def _run(self, query: str) -> str:
         return self._tool_run(query)
 
 
+@functools.lru_cache(maxsize=None)
+def _get_kb_tool() -> KnowledgeBaseTool:
+    """Return the shared KnowledgeBaseTool, creating it on first use."""
+    return KnowledgeBaseTool()
+
+
 def get_component_info(component_query: str) -> Dict:
     """Get component information from the knowledge base.
     
@@ -190,7 +288,7 @@ def get_component_info(component_query: str) -> Dict:
     Returns:
         Dictionary with component information.
     """
-    kb_tool = KnowledgeBaseTool()
+    kb_tool = _get_kb_tool()
     result_json = kb_tool._tool_run(component_query)
     results = json.loads(result_json)
     
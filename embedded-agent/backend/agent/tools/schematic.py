@@ -2,7 +2,8 @@
 Schematic Tool for 8051 Embedded Design Agent.
 
 This tool generates circuit schematics based on netlist information provided in JSON format.
-It supports both visual (using matplotlib) and text-based schematic generation.
+By default it writes an SVG schematic directly; PNG/SVG rendering via matplotlib can be
+enabled with ``render_png=True``, and a text-based schematic is used as a fallback.
 
 Connection Format:
 ---------------
@@ -60,14 +61,349 @@ Output JSON format:
 }
 """
 
+import functools
+import hashlib
+import importlib.util
 import os
 import json
-import time
-import traceback
-from typing import Dict, List, Optional, Any
+import logging
+import math
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+from xml.sax.saxutils import escape
 
+import fastjsonschema
 from langchain.tools.base import BaseTool
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+logger = logging.getLogger(__name__)
+
+
+if HAS_ORJSON:
+    _loads = orjson.loads
+
+    def _canonical_bytes(obj: Any) -> bytes:
+        """Serialize obj with sorted keys, for content hashing."""
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    _JSON_DECODE_ERRORS = (orjson.JSONDecodeError, ValueError)
+
+    def _dumps(obj: Any, pretty: bool = False) -> str:
+        """Serialize a tool response as compact JSON, or indented when pretty is set."""
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(obj, option=option).decode()
+else:
+    _loads = json.loads
+
+    def _canonical_bytes(obj: Any) -> bytes:
+        """Serialize obj with sorted keys, for content hashing."""
+        return json.dumps(obj, sort_keys=True).encode()
+    _JSON_DECODE_ERRORS = (json.JSONDecodeError, ValueError)
+
+    def _dumps(obj: Any, pretty: bool = False) -> str:
+        """Serialize a tool response as compact JSON, or indented when pretty is set."""
+        if pretty:
+            return json.dumps(obj, indent=2)
+        return json.dumps(obj, separators=(",", ":"))
+
+
+# A connection endpoint is either "component.pin" or {"component": ..., "pin": ...}
+_ENDPOINT_SCHEMA = {
+    "anyOf": [
+        {"type": "string"},
+        {"type": "object", "required": ["component", "pin"]}
+    ]
+}
+
+NETLIST_SCHEMA = {
+    "type": "object",
+    "required": ["components", "connections"],
+    "properties": {
+        "components": {"type": "array"},
+        "connections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["from", "to"],
+                "properties": {
+                    "from": _ENDPOINT_SCHEMA,
+                    "to": _ENDPOINT_SCHEMA
+                }
+            }
+        }
+    }
+}
+
+# Compiled once at import; validation then runs as generated Python code
+_VALIDATE_NETLIST = fastjsonschema.compile(NETLIST_SCHEMA)
+
+
+def _schema_error(e: fastjsonschema.JsonSchemaValueException) -> Dict[str, Any]:
+    """Translate a netlist schema violation into the tool's error envelope."""
+    path = e.path[1:]  # drop the leading "data"
+    
+    if not path:
+        if e.rule == "required":
+            return {
+                "success": False,
+                "message": "Missing required fields",
+                "error": "Invalid netlist format. Must contain 'components' and 'connections'"
+            }
+        return {
+            "success": False,
+            "message": "Invalid input format",
+            "error": "Input must be a JSON object/dictionary"
+        }
+    
+    if path == ["components"]:
+        return {
+            "success": False,
+            "message": "Invalid components format",
+            "error": "'components' must be a list of component objects"
+        }
+    
+    if path == ["connections"]:
+        return {
+            "success": False,
+            "message": "Invalid connections format",
+            "error": "'connections' must be a list of connection objects"
+        }
+    
+    index = path[1] if len(path) > 1 else "?"
+    if len(path) == 2:
+        if e.rule == "required":
+            return {
+                "success": False,
+                "message": "Missing connection fields",
+                "error": f"Connection at index {index} must have both 'from' and 'to' fields"
+            }
+        return {
+            "success": False,
+            "message": "Invalid connection format",
+            "error": f"Connection at index {index} must be a dictionary with 'from' and 'to' keys"
+        }
+    
+    return {
+        "success": False,
+        "message": "Invalid connection format",
+        "error": (f"Connection '{path[2]}' at index {index} must be either a string or "
+                  f"a dictionary with 'component' and 'pin' fields")
+    }
+
+
+# Component shapes and colors; _SHAPE_IDX maps an upper-cased component type to its entry
+ShapeSpec = namedtuple("ShapeSpec", "shape width height radius color")
+_SHAPES = (
+    ShapeSpec("rectangle", 120, 120, 0, "lightblue"),    # 0: microcontroller
+    ShapeSpec("rectangle", 80, 40, 0, "lightgreen"),     # 1: sensor
+    ShapeSpec("circle", 0, 0, 20, "yellow"),             # 2: LED
+    ShapeSpec("rectangle", 60, 20, 0, "beige"),          # 3: resistor
+    ShapeSpec("rectangle", 40, 20, 0, "lightgray"),      # 4: capacitor
+    ShapeSpec("circle", 0, 0, 25, "lightcoral"),         # 5: transistor
+    ShapeSpec("rectangle", 60, 30, 0, "lightpink"),      # 6: switch
+    ShapeSpec("rectangle", 80, 40, 0, "white"),          # 7: default
+)
+_SHAPE_IDX = {
+    "MICROCONTROLLER": 0, "MCU": 0, "SENSOR": 1, "LED": 2, "RESISTOR": 3,
+    "CAPACITOR": 4, "TRANSISTOR": 5, "SWITCH": 6,
+}
+_DEFAULT_SHAPE_IDX = 7
+
+# Schematics are laid out on a CANVAS_SIZE x CANVAS_SIZE canvas
+CANVAS_SIZE = 1000
+
+# Connection labels are only drawn for netlists with at most this many connections
+MAX_CONNECTION_LABELS = 50
+
+# matplotlib objects, imported on first visual render (see _load_matplotlib)
+_MPL = None
+
+# Worker that encodes PNGs while the calling thread writes the matching SVG
+_RENDER_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="schematic-render")
+
+
+def _load_matplotlib():
+    """Import matplotlib on first use and cache the objects the renderer needs."""
+    global _MPL
+    if _MPL is None:
+        import matplotlib
+        # Headless rendering only: skip GUI backend autodetection and DISPLAY probing
+        matplotlib.use("Agg", force=True)
+        import matplotlib.pyplot as plt
+        from matplotlib.image import imsave
+        from matplotlib.patches import Rectangle, Circle
+        from matplotlib.collections import PatchCollection, LineCollection
+        _MPL = (plt, imsave, Rectangle, Circle, PatchCollection, LineCollection)
+    return _MPL
+
+
+# Side of the square character grid of the ASCII schematic
+ASCII_GRID_SIZE = 40
+
+
+def _ascii_positions(components, grid_size: int) -> Dict[str, Tuple[int, int]]:
+    """Grid cell of each component's label in the ASCII schematic."""
+    positions = {}
+    for i, comp in enumerate(components):
+        comp_id = comp.get("id", f"C{i}")
+        # Use provided position if available, otherwise place components linearly
+        if "position" in comp and "x" in comp["position"] and "y" in comp["position"]:
+            x = min(grid_size-1, max(0, int(comp["position"]["x"]) % grid_size))
+            y = min(grid_size-1, max(0, int(comp["position"]["y"]) % grid_size))
+        else:
+            x = 5 + (i % 5) * 8
+            y = 5 + (i // 5) * 8
+        positions[comp_id] = (x, y)
+    return positions
+
+
+def _import_numpy():
+    """Import NumPy on first use; None when it isn't available."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+# The compiled ASCII rasterizer is used when numba is installed and a netlist
+# has at least this many drawable connections (smaller ones aren't worth the JIT)
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+NUMBA_MIN_SEGMENTS = 256
+
+
+def _rasterize_segments(grid, segs):
+    """Draw (x1, y1, x2, y2) segments on a codepoint grid: horizontal on y1, then vertical at max(x1, x2)."""
+    for x1, y1, x2, y2 in segs.tolist():
+        end_x = max(x1, x2)
+        row = grid[y1, min(x1, x2):end_x + 1]
+        row[row == 32] = 45               # ' ' -> '-'
+        
+        col = grid[min(y1, y2):max(y1, y2) + 1, end_x]
+        col[col == 45] = 43               # '-' -> '+'
+        col[col == 32] = 124              # ' ' -> '|'
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_rasterizer():
+    """Compile the native version of _rasterize_segments on first use."""
+    import numba
+    
+    @numba.njit(cache=True)
+    def rasterize(grid, segs):
+        for s in range(segs.shape[0]):
+            x1, y1, x2, y2 = segs[s, 0], segs[s, 1], segs[s, 2], segs[s, 3]
+            end_x = max(x1, x2)
+            for x in range(min(x1, x2), end_x + 1):
+                if grid[y1, x] == 32:
+                    grid[y1, x] = 45
+            for y in range(min(y1, y2), max(y1, y2) + 1):
+                c = grid[y, end_x]
+                if c == 45:
+                    grid[y, end_x] = 43
+                elif c == 32:
+                    grid[y, end_x] = 124
+    
+    return rasterize
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_endpoint_str(val: str) -> Tuple[Tuple[str, str], ...]:
+    """Split a string endpoint into (component, pin) pairs.
+    
+    Netlists repeat the same endpoints ("VCC", "GND", "U1.XTAL1") many times,
+    so results are cached and returned as immutable tuples.
+    """
+    return tuple(
+        (comp, pin if sep else "1")
+        for comp, sep, pin in (part.strip().partition(".") for part in val.split(","))
+    )
+
+
+# Fixed parts of the schematic description; the component and connection lines
+# in between are collected by the generators while they draw (see desc_parts)
+DESCRIPTION_HEADER = "This schematic includes the following components:\n"
+DESCRIPTION_CONNECTIONS = "\nConnections:\n"
+DESCRIPTION_FOOTER = (
+    "\nCircuit description:\n"
+    "This circuit represents a schematic design with the specified components and connections."
+)
+
+
+def _default_positions(count: int) -> List[Tuple[int, int]]:
+    """Deterministic grid positions for components that don't specify one.
+    
+    Components are spread row by row over the central 800x800 area of the canvas.
+    """
+    if count == 0:
+        return []
+    cols = int(math.ceil(math.sqrt(count)))
+    step = 800 // cols
+    
+    np = _import_numpy()
+    if np is None:
+        return [(100 + (i % cols) * step, 100 + (i // cols) * step) for i in range(count)]
+    idx = np.arange(count)
+    xs = 100 + (idx % cols) * step
+    ys = 100 + (idx // cols) * step
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """Write data to path with a single unbuffered write, replacing any existing file."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _describe_component(comp_id, comp_type, comp_value) -> str:
+    """Format one component line of the schematic description."""
+    if comp_value:
+        return f"- {comp_id} ({comp_type}, {comp_value})\n"
+    return f"- {comp_id} ({comp_type})\n"
+
+
+# Contents of the text and ASCII files for a netlist without components
+EMPTY_SCHEMATIC = b"(empty)\n"
+
+# Output file paths for a single schematic ("json" holds the cached tool response)
+SchematicPaths = namedtuple("SchematicPaths", "txt ascii png svg json")
+
+# Most recently generated responses, keyed by schematic_id
+ENVELOPE_CACHE_SIZE = 128
+_ENVELOPE_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_ENVELOPE_CACHE_LOCK = threading.Lock()
+
+
+def _cached_envelope(schematic_id: str) -> Optional[str]:
+    """Return the in-process cached response for schematic_id, if any."""
+    with _ENVELOPE_CACHE_LOCK:
+        envelope = _ENVELOPE_CACHE.get(schematic_id)
+        if envelope is not None:
+            _ENVELOPE_CACHE.move_to_end(schematic_id)
+        return envelope
+
+
+def _remember_envelope(schematic_id: str, envelope: str) -> None:
+    """Cache a response in process, evicting the least recently used one when full."""
+    with _ENVELOPE_CACHE_LOCK:
+        _ENVELOPE_CACHE[schematic_id] = envelope
+        _ENVELOPE_CACHE.move_to_end(schematic_id)
+        if len(_ENVELOPE_CACHE) > ENVELOPE_CACHE_SIZE:
+            _ENVELOPE_CACHE.popitem(last=False)
+
+
 class SchematicTool(BaseTool):
     """Tool for generating schematic diagrams for electronic circuits."""
     
@@ -80,15 +416,23 @@ class SchematicTool(BaseTool):
     
     output_dir: str = "backend/outputs/schematics"
     has_visualization_libs: bool = False
+    render_png: bool = False
+    pretty: bool = False
+    _out_prefix: str = ""
     
-    def __init__(self, output_dir: Optional[str] = None):
+    def __init__(self, output_dir: Optional[str] = None, render_png: bool = False, pretty: bool = False):
         """Initialize schematic generation tool.
         
         Args:
             output_dir: Directory where schematic files will be saved
+            render_png: Render PNG and SVG with matplotlib instead of writing SVG directly
+            pretty: Indent the JSON responses (they are compact by default)
         """
         super().__init__()
         
+        self.render_png = render_png
+        self.pretty = pretty
+        
         # Set default output directory if not provided
         if output_dir:
             self.output_dir = output_dir
@@ -98,19 +442,19 @@ class SchematicTool(BaseTool):
         # Create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
         
+        # Output directory with a trailing separator, so per-schematic paths are plain f-strings
+        # (set with object.__setattr__: pydantic v1 models reject undeclared underscore attributes)
+        object.__setattr__(self, "_out_prefix", os.path.join(self.output_dir, ""))
+        
         # Check if necessary libraries for advanced visualization are available
         self.has_visualization_libs = self._check_visualization_libraries()
         
     def _check_visualization_libraries(self) -> bool:
-        """Check if visualization libraries are available"""
-        try:
-            import matplotlib
-            import matplotlib.pyplot as plt
-            import numpy as np
+        """Check if visualization libraries are available (without importing them)"""
+        if importlib.util.find_spec("matplotlib") is not None and importlib.util.find_spec("numpy") is not None:
             return True
-        except ImportError:
-            print("WARNING: Matplotlib or NumPy not found. Will use basic visualization.")
-            return False
+        print("WARNING: Matplotlib or NumPy not found. Will use basic visualization.")
+        return False
     
     def _tool_run(self, input_str: str) -> str:
         """Generate circuit schematic based on netlist information.
@@ -135,155 +479,39 @@ class SchematicTool(BaseTool):
         try:
             # Parse input
             try:
-                netlist = json.loads(input_str)
-            except json.JSONDecodeError as e:
-                return json.dumps({
+                netlist = _loads(input_str)
+            except _JSON_DECODE_ERRORS as e:
+                return self._dumps({
                     "success": False,
                     "message": "Invalid input format",
                     "error": f"Input is not a valid JSON string: {str(e)}"
-                }, indent=2)
+                })
             
             # Validate input
-            if not isinstance(netlist, dict):
-                return json.dumps({
-                    "success": False,
-                    "message": "Invalid input format",
-                    "error": "Input must be a JSON object/dictionary"
-                }, indent=2)
-                
-            if "components" not in netlist or "connections" not in netlist:
-                return json.dumps({
-                    "success": False,
-                    "message": "Missing required fields",
-                    "error": "Invalid netlist format. Must contain 'components' and 'connections'"
-                }, indent=2)
-            
-            # Validate components and connections are lists
-            if not isinstance(netlist.get("components", []), list):
-                return json.dumps({
-                    "success": False,
-                    "message": "Invalid components format",
-                    "error": "'components' must be a list of component objects"
-                }, indent=2)
-                
-            if not isinstance(netlist.get("connections", []), list):
-                return json.dumps({
-                    "success": False,
-                    "message": "Invalid connections format",
-                    "error": "'connections' must be a list of connection objects"
-                }, indent=2)
+            try:
+                _VALIDATE_NETLIST(netlist)
+            except fastjsonschema.JsonSchemaValueException as e:
+                return self._dumps(_schema_error(e))
             
-            # Pre-validate connections
-            for i, conn in enumerate(netlist.get("connections", [])):
-                if not isinstance(conn, dict):
-                    return json.dumps({
-                        "success": False,
-                        "message": "Invalid connection format",
-                        "error": f"Connection at index {i} must be a dictionary with 'from' and 'to' keys"
-                    }, indent=2)
-                    
-                if "from" not in conn or "to" not in conn:
-                    return json.dumps({
-                        "success": False,
-                        "message": "Missing connection fields",
-                        "error": f"Connection at index {i} must have both 'from' and 'to' fields"
-                    }, indent=2)
+            # Nothing to draw: skip connection processing and rendering entirely
+            if not netlist["components"]:
+                return self._empty_response("no components")
             
             try:
                 # 预处理连接数据：将字符串格式转换为字典格式
                 if "connections" in netlist:
                     new_connections = []
                     for i, conn in enumerate(netlist["connections"]):
-                        # 处理 "from" 字段
-                        from_parts = []
-                        if "from" in conn and isinstance(conn["from"], str):
-                            # 检查是否有逗号分隔的多个引脚
-                            if "," in conn["from"]:
-                                # 有多个引脚，需要拆分为多个连接
-                                from_pins = [pin.strip() for pin in conn["from"].split(",")]
-                                for pin in from_pins:
-                                    if "." in pin:
-                                        comp, pin_id = pin.split(".", 1)
-                                        from_parts.append({"component": comp, "pin": pin_id})
-                                    else:
-                                        # 无引脚标识，使用整个字符串作为组件名，引脚默认为"1"
-                                        from_parts.append({"component": pin, "pin": "1"})
-                            elif "." in conn["from"]:
-                                # 单个引脚，标准格式
-                                comp, pin = conn["from"].split(".", 1)
-                                from_parts = [{"component": comp, "pin": pin}]
-                            else:
-                                # 无引脚标识，使用原始字符串
-                                from_parts = [{"component": conn["from"], "pin": "1"}]
-                        elif isinstance(conn.get("from"), dict):
-                            # 已经是字典格式
-                            if "component" in conn["from"] and "pin" in conn["from"]:
-                                from_parts = [conn["from"]]
-                            else:
-                                return json.dumps({
-                                    "success": False,
-                                    "message": "Invalid connection format",
-                                    "error": f"Connection 'from' at index {i} has invalid dictionary format, must contain 'component' and 'pin' fields"
-                                }, indent=2)
-                        else:
-                            return json.dumps({
-                                "success": False,
-                                "message": "Invalid connection format",
-                                "error": f"Connection 'from' at index {i} must be either a string or dictionary"
-                            }, indent=2)
-                        
-                        # 处理 "to" 字段
-                        to_parts = []
-                        if "to" in conn and isinstance(conn["to"], str):
-                            # 检查是否有逗号分隔的多个引脚
-                            if "," in conn["to"]:
-                                # 有多个引脚，需要拆分为多个连接
-                                to_pins = [pin.strip() for pin in conn["to"].split(",")]
-                                for pin in to_pins:
-                                    if "." in pin:
-                                        comp, pin_id = pin.split(".", 1)
-                                        to_parts.append({"component": comp, "pin": pin_id})
-                                    else:
-                                        # 无引脚标识，使用整个字符串作为组件名，引脚默认为"1"
-                                        to_parts.append({"component": pin, "pin": "1"})
-                            elif "." in conn["to"]:
-                                # 单个引脚，标准格式
-                                comp, pin = conn["to"].split(".", 1)
-                                to_parts = [{"component": comp, "pin": pin}]
-                            else:
-                                # 无引脚标识，使用原始字符串
-                                to_parts = [{"component": conn["to"], "pin": "1"}]
-                        elif isinstance(conn.get("to"), dict):
-                            # 已经是字典格式
-                            if "component" in conn["to"] and "pin" in conn["to"]:
-                                to_parts = [conn["to"]]
-                            else:
-                                return json.dumps({
-                                    "success": False,
-                                    "message": "Invalid connection format",
-                                    "error": f"Connection 'to' at index {i} has invalid dictionary format, must contain 'component' and 'pin' fields"
-                                }, indent=2)
-                        else:
-                            return json.dumps({
-                                "success": False,
-                                "message": "Invalid connection format",
-                                "error": f"Connection 'to' at index {i} must be either a string or dictionary"
-                            }, indent=2)
-                        
-                        # 验证 from_parts 和 to_parts 是否为空
-                        if not from_parts:
-                            return json.dumps({
-                                "success": False,
-                                "message": "Invalid connection format",
-                                "error": f"Could not parse 'from' field at connection index {i}"
-                            }, indent=2)
-                        
-                        if not to_parts:
-                            return json.dumps({
+                        # 解析 "from" 和 "to" 字段
+                        try:
+                            from_parts = self._parse_endpoint(conn["from"])
+                            to_parts = self._parse_endpoint(conn["to"])
+                        except ValueError as e:
+                            return self._dumps({
                                 "success": False,
                                 "message": "Invalid connection format",
-                                "error": f"Could not parse 'to' field at connection index {i}"
-                            }, indent=2)
+                                "error": f"Connection at index {i}: {str(e)}"
+                            })
                         
                         # 创建新的连接
                         # 处理一对多的情况
@@ -319,110 +547,193 @@ class SchematicTool(BaseTool):
                     
                     # 用预处理后的连接替换原始连接
                     netlist["connections"] = new_connections
+                    
+                    # Flattened (from_comp, from_pin, to_comp, to_pin) tuples for the generators
+                    netlist["_flat_conns"] = [
+                        (conn["from"]["component"], conn["from"]["pin"], conn["to"]["component"], conn["to"]["pin"])
+                        for conn in new_connections
+                    ]
             
             except Exception as e:
                 # 捕获连接预处理过程中的任何错误
-                return json.dumps({
+                return self._dumps({
                     "success": False,
                     "message": "Error processing connections",
                     "error": f"Failed to process connections: {str(e)}"
-                }, indent=2)
+                })
+            
+            # The schematic ID is a hash of the normalized netlist and render mode, so
+            # re-requesting the same schematic reuses the files already on disk
+            digest = hashlib.blake2b(_canonical_bytes(netlist), digest_size=16)
+            digest.update(b"png" if self.render_png else b"svg")
+            schematic_id = f"schematic_{digest.hexdigest()}"
+            prefix = f"{self._out_prefix}{schematic_id}"
+            paths = SchematicPaths(f"{prefix}.txt", f"{prefix}_ascii.txt", f"{prefix}.png",
+                                   f"{prefix}.svg", f"{prefix}.json")
             
-            # Generate a unique ID for this schematic
-            schematic_id = f"schematic_{int(time.time())}"
+            cached = self._load_cached_schematic(schematic_id, paths)
+            if cached is not None:
+                return cached
             
-            # Generate schematic based on available libraries
+            # Generate schematic based on available libraries. The generators also
+            # collect the description lines while they walk the netlist.
             schematic_info = {}
+            desc_parts = []
             
             try:
-                # Try to generate a visual schematic using matplotlib
-                schematic_info = self._generate_visual_schematic(netlist, schematic_id)
+                if self.render_png:
+                    # Generate a visual schematic (PNG + SVG) using matplotlib
+                    schematic_info = self._generate_visual_schematic(netlist, schematic_id, paths, desc_parts)
+                else:
+                    # Write the SVG directly; no plotting library needed
+                    schematic_info = self._generate_svg_schematic(netlist, schematic_id, paths, desc_parts)
             except ImportError:
                 print("Visualization libraries not available: No module named 'matplotlib'. Falling back to text-based schematic.")
                 # Fall back to text-based schematic if matplotlib is not available
-                schematic_info = self._generate_text_schematic(netlist, schematic_id)
+                desc_parts = []
+                schematic_info = self._generate_text_schematic(netlist, schematic_id, paths, desc_parts)
             except Exception as e:
-                return json.dumps({
+                return self._dumps({
                     "success": False,
                     "message": "Error generating visual schematic",
                     "error": f"Failed to generate visual schematic: {str(e)}"
-                }, indent=2)
+                })
             
             # Add a description of the schematic
-            try:
-                schematic_info["description"] = self._generate_schematic_description(netlist)
-            except Exception as e:
-                # If description generation fails, add a basic description
-                schematic_info["description"] = "Circuit schematic (description generation failed)"
-                print(f"Warning: Failed to generate schematic description: {str(e)}")
+            schematic_info["description"] = f"{DESCRIPTION_HEADER}{''.join(desc_parts)}{DESCRIPTION_FOOTER}"
             
             # 构建标准化的输出结构
             if schematic_info.get("success", False):
-                return json.dumps({
+                # The cached copy is always compact; self._restyle indents it on the way out
+                envelope = _dumps({
                     "success": True,
                     "message": f"Successfully generated schematic with ID {schematic_id}",
                     "data": schematic_info
-                }, indent=2)
+                })
+                _write_bytes(paths.json, envelope.encode('utf-8'))
+                _remember_envelope(schematic_id, envelope)
+                return self._restyle(envelope)
             else:
-                return json.dumps({
+                return self._dumps({
                     "success": False,
                     "message": "Failed to generate schematic",
                     "error": schematic_info.get("error", "Unknown error in schematic generation")
-                }, indent=2)
+                })
             
         except Exception as e:
             error_msg = f"Error generating schematic: {str(e)}"
-            print(error_msg)
-            import traceback
-            traceback.print_exc()
-            return json.dumps({
+            logger.debug("schematic failure", exc_info=True)
+            return self._dumps({
                 "success": False,
                 "message": "Error generating schematic",
                 "error": error_msg
-            }, indent=2)
+            })
     
-    def _generate_text_schematic(self, netlist, schematic_id):
-        """Generate a text-based schematic representation"""
+    def _dumps(self, obj: Any) -> str:
+        """Serialize a tool response in this tool's output style."""
+        return _dumps(obj, self.pretty)
+    
+    def _restyle(self, envelope: str) -> str:
+        """Convert a compact cached response to this tool's output style."""
+        return self._dumps(_loads(envelope)) if self.pretty else envelope
+    
+    def _empty_response(self, reason: str) -> str:
+        """Return the response for a netlist with nothing to draw, writing its placeholder files once."""
+        schematic_id = "schematic_empty"
+        file_path = f"{self._out_prefix}{schematic_id}.txt"
+        ascii_file_path = f"{self._out_prefix}{schematic_id}_ascii.txt"
+        if not os.path.exists(ascii_file_path):
+            _write_bytes(file_path, EMPTY_SCHEMATIC)
+            _write_bytes(ascii_file_path, EMPTY_SCHEMATIC)
+        
+        return self._dumps({
+            "success": True,
+            "message": f"Generated empty schematic ({reason})",
+            "data": {
+                "success": True,
+                "schematic_id": schematic_id,
+                "file_path": file_path,
+                "ascii_file_path": ascii_file_path,
+                "schematic_type": "empty",
+                "description": f"The schematic is empty ({reason})."
+            }
+        })
+    
+    def _load_cached_schematic(self, schematic_id: str, paths: SchematicPaths) -> Optional[str]:
+        """Return the stored response for an already generated schematic, if its files still exist."""
+        if not (os.path.exists(paths.svg) or os.path.exists(paths.txt)):
+            return None
+        
+        envelope = _cached_envelope(schematic_id)
+        if envelope is None and os.path.exists(paths.json):
+            with open(paths.json, 'r', encoding='utf-8') as f:
+                envelope = f.read()
+            _remember_envelope(schematic_id, envelope)
+        return None if envelope is None else self._restyle(envelope)
+    
+    @staticmethod
+    def _parse_endpoint(val) -> List[Dict[str, str]]:
+        """Parse a connection endpoint into a list of {"component", "pin"} dicts.
+        
+        Strings may name several comma-separated pins ("U1.P1.0, U1.P1.1"); a pin
+        without a "." uses the whole string as the component and defaults to pin "1".
+        
+        Raises:
+            ValueError: If the endpoint is neither a valid string nor a valid dictionary.
+        """
+        if isinstance(val, dict):
+            if "component" not in val or "pin" not in val:
+                raise ValueError("dictionary endpoint must contain 'component' and 'pin' fields")
+            return [val]
+        if not isinstance(val, str):
+            raise ValueError("endpoint must be either a string or dictionary")
+        # Fresh dicts per call so downstream code can't mutate the cached tuples
+        return [{"component": comp, "pin": pin} for comp, pin in _parse_endpoint_str(val)]
+    
+    def _generate_text_schematic(self, netlist, schematic_id, paths, desc_parts):
+        """Generate a text-based schematic representation.
+        
+        Description lines for the components and connections are appended to desc_parts.
+        """
         components = netlist.get("components", [])
-        connections = netlist.get("connections", [])
+        connections = netlist["_flat_conns"]
         
         # Create a text-based representation of the schematic
-        schematic_text = "SCHEMATIC DIAGRAM (Text Representation)\n"
-        schematic_text += "=" * 50 + "\n\n"
-        
-        # Component section
-        schematic_text += "COMPONENTS:\n"
-        schematic_text += "-" * 50 + "\n"
+        parts = [
+            "SCHEMATIC DIAGRAM (Text Representation)\n",
+            "=" * 50 + "\n\n",
+            # Component section
+            "COMPONENTS:\n",
+            "-" * 50 + "\n"
+        ]
         for comp in components:
             comp_id = comp.get("id", "???")
             comp_type = comp.get("type", "Unknown")
             comp_value = comp.get("value", "")
-            schematic_text += f"{comp_id}: {comp_type} {comp_value}\n"
+            parts.append(f"{comp_id}: {comp_type} {comp_value}\n")
+            desc_parts.append(_describe_component(comp.get("id", ""), comp.get("type", "").upper(), comp_value))
+        
+        desc_parts.append(DESCRIPTION_CONNECTIONS)
         
-        schematic_text += "\n"
+        parts.append("\n")
         
         # Connection section
-        schematic_text += "CONNECTIONS:\n"
-        schematic_text += "-" * 50 + "\n"
-        for conn in connections:
-            # 获取连接的两端（预处理后应该都是字典格式）
-            from_comp = conn.get("from", {}).get("component", "???")
-            from_pin = conn.get("from", {}).get("pin", "???")
-            to_comp = conn.get("to", {}).get("component", "???")
-            to_pin = conn.get("to", {}).get("pin", "???")
-            
-            schematic_text += f"{from_comp}.{from_pin} --> {to_comp}.{to_pin}\n"
+        parts.append("CONNECTIONS:\n")
+        parts.append("-" * 50 + "\n")
+        for from_comp, from_pin, to_comp, to_pin in connections:
+            parts.append(f"{from_comp}.{from_pin} --> {to_comp}.{to_pin}\n")
+            desc_parts.append(f"- {from_comp}.{from_pin} connected to {to_comp}.{to_pin}\n")
+        
+        schematic_text = "".join(parts)
         
         # Save to file
-        file_path = os.path.join(self.output_dir, f"{schematic_id}.txt")
-        with open(file_path, 'w') as f:
-            f.write(schematic_text)
+        file_path = paths.txt
+        _write_bytes(file_path, schematic_text.encode('utf-8'))
         
         # Generate a basic ASCII art schematic
         ascii_schematic = self._generate_ascii_schematic(netlist)
-        ascii_file_path = os.path.join(self.output_dir, f"{schematic_id}_ascii.txt")
-        with open(ascii_file_path, 'w') as f:
-            f.write(ascii_schematic)
+        ascii_file_path = paths.ascii
+        _write_bytes(ascii_file_path, ascii_schematic.encode('utf-8'))
         
         return {
             "success": True,
@@ -435,130 +746,236 @@ class SchematicTool(BaseTool):
     
     def _generate_ascii_schematic(self, netlist):
         """Generate a simple ASCII art schematic"""
+        np = _import_numpy()
+        if np is None:
+            # This is the fallback for missing visualization libraries, so it
+            # must also work without NumPy
+            return self._generate_ascii_schematic_py(netlist)
+        
         components = netlist.get("components", [])
-        connections = netlist.get("connections", [])
+        connections = netlist["_flat_conns"]
         
         # Create a grid
-        grid_size = 40
-        grid = [[' ' for _ in range(grid_size)] for _ in range(grid_size)]
+        grid_size = ASCII_GRID_SIZE
+        grid = np.full((grid_size, grid_size), ' ', dtype='U1')
         
         # Place components on grid
-        comp_positions = {}
+        comp_positions = _ascii_positions(components, grid_size)
+        for comp_id, (x, y) in comp_positions.items():
+            # Place component ID on grid (clipped at the right edge)
+            label = grid[y, x:x + len(comp_id)]
+            label[:] = list(comp_id[:label.size])
+        
+        # Draw connections as simple lines (horizontal then vertical). The
+        # rasterizers work on the grid's codepoints, which share its memory.
+        segs = np.array(
+            [(*comp_positions[from_comp], *comp_positions[to_comp])
+             for from_comp, _, to_comp, _ in connections
+             if from_comp in comp_positions and to_comp in comp_positions],
+            dtype=np.int64
+        ).reshape(-1, 4)
+        codepoints = grid.view(np.uint32)
+        if HAS_NUMBA and len(segs) >= NUMBA_MIN_SEGMENTS:
+            _numba_rasterizer()(codepoints, segs)
+        else:
+            _rasterize_segments(codepoints, segs)
+        
+        # Convert grid to string
+        return "\n".join("".join(row) for row in grid.tolist()) + "\n"
+    
+    def _generate_ascii_schematic_py(self, netlist):
+        """Generate the ASCII art schematic on a list-of-lists grid (without NumPy)"""
+        components = netlist.get("components", [])
+        connections = netlist["_flat_conns"]
+        
+        grid_size = ASCII_GRID_SIZE
+        grid = [[' '] * grid_size for _ in range(grid_size)]
+        
+        comp_positions = _ascii_positions(components, grid_size)
+        for comp_id, (x, y) in comp_positions.items():
+            for j, char in enumerate(comp_id[:grid_size - x]):
+                grid[y][x + j] = char
+        
+        for from_comp, _, to_comp, _ in connections:
+            if from_comp not in comp_positions or to_comp not in comp_positions:
+                continue
+            x1, y1 = comp_positions[from_comp]
+            x2, y2 = comp_positions[to_comp]
+            
+            # Horizontal on y1, then vertical at the right end
+            end_x = max(x1, x2)
+            row = grid[y1]
+            for x in range(min(x1, x2), end_x + 1):
+                if row[x] == ' ':
+                    row[x] = '-'
+            for y in range(min(y1, y2), max(y1, y2) + 1):
+                if grid[y][end_x] == ' ':
+                    grid[y][end_x] = '|'
+                elif grid[y][end_x] == '-':
+                    grid[y][end_x] = '+'
+        
+        return "\n".join("".join(row) for row in grid) + "\n"
+    
+    def _generate_svg_schematic(self, netlist, schematic_id, paths, desc_parts):
+        """Generate an SVG schematic by writing the markup directly (no matplotlib).
+        
+        Description lines for the components and connections are appended to desc_parts.
+        """
+        components = netlist.get("components", [])
+        connections = netlist["_flat_conns"]
+        
+        # SVG's y axis points down; flip it so layouts match the matplotlib renderer
+        top = CANVAS_SIZE
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{CANVAS_SIZE}" height="{CANVAS_SIZE}" '
+            f'viewBox="0 0 {CANVAS_SIZE} {CANVAS_SIZE}" font-family="sans-serif">\n',
+            f'<text x="{CANVAS_SIZE / 2}" y="30" text-anchor="middle" font-size="20">Circuit Schematic</text>\n'
+        ]
+        
+        # Draw components
+        comp_centers = {}
+        shapes = []
+        labels = []
+        default_positions = None
         for i, comp in enumerate(components):
-            comp_id = comp.get("id", f"C{i}")
-            # Use provided position if available, otherwise place components linearly
+            comp_id = comp.get("id", "")
+            comp_type = comp.get("type", "").upper()
+            comp_value = comp.get("value", "")
+            desc_parts.append(_describe_component(comp_id, comp_type, comp_value))
+            
+            # Get position or assign default
             if "position" in comp and "x" in comp["position"] and "y" in comp["position"]:
-                x = min(grid_size-1, max(0, int(comp["position"]["x"]) % grid_size))
-                y = min(grid_size-1, max(0, int(comp["position"]["y"]) % grid_size))
+                x = comp["position"]["x"]
+                y = comp["position"]["y"]
             else:
-                x = 5 + (i % 5) * 8
-                y = 5 + (i // 5) * 8
+                # Assign a grid position if not specified
+                if default_positions is None:
+                    default_positions = _default_positions(len(components))
+                x, y = default_positions[i]
             
-            comp_positions[comp_id] = (x, y)
+            shape = _SHAPES[_SHAPE_IDX.get(comp_type, _DEFAULT_SHAPE_IDX)]
+            sy = top - y
             
-            # Place component ID on grid
-            for j, char in enumerate(comp_id):
-                if x + j < grid_size:
-                    grid[y][x + j] = char
+            if shape.shape == "rectangle":
+                width, height = shape.width, shape.height
+                shapes.append(
+                    f'<rect x="{x - width / 2}" y="{sy - height / 2}" width="{width}" height="{height}" '
+                    f'fill="{shape.color}" fill-opacity="0.7" stroke="black"/>\n'
+                )
+                comp_centers[comp_id] = (x, sy)
+            elif shape.shape == "circle":
+                shapes.append(
+                    f'<circle cx="{x}" cy="{sy}" r="{shape.radius}" '
+                    f'fill="{shape.color}" fill-opacity="0.7" stroke="black"/>\n'
+                )
+                comp_centers[comp_id] = (x, sy)
+            
+            # Component label, with the value on a second line
+            if comp_value:
+                labels.append(
+                    f'<text x="{x}" y="{sy}" text-anchor="middle" font-size="12">'
+                    f'<tspan x="{x}" dy="-0.2em">{escape(str(comp_id))}</tspan>'
+                    f'<tspan x="{x}" dy="1.2em">{escape(str(comp_value))}</tspan></text>\n'
+                )
+            else:
+                labels.append(
+                    f'<text x="{x}" y="{sy}" text-anchor="middle" dominant-baseline="middle" '
+                    f'font-size="12">{escape(str(comp_id))}</text>\n'
+                )
         
         # Draw connections
-        for conn in connections:
-            # 获取连接的组件名（预处理后应该都是字典格式）
-            from_comp = conn.get("from", {}).get("component", "")
-            to_comp = conn.get("to", {}).get("component", "")
+        desc_parts.append(DESCRIPTION_CONNECTIONS)
+        lines = []
+        line_labels = []
+        for from_comp, from_pin, to_comp, to_pin in connections:
+            desc_parts.append(f"- {from_comp}.{from_pin} connected to {to_comp}.{to_pin}\n")
             
-            if from_comp in comp_positions and to_comp in comp_positions:
-                x1, y1 = comp_positions[from_comp]
-                x2, y2 = comp_positions[to_comp]
-                
-                # Draw a simple line (horizontal then vertical)
-                # First horizontal
-                start_x = min(x1, x2)
-                end_x = max(x1, x2)
-                mid_y = y1
-                
-                for x in range(start_x, end_x + 1):
-                    if grid[mid_y][x] == ' ':
-                        grid[mid_y][x] = '-'
-                
-                # Then vertical
-                start_y = min(mid_y, y2)
-                end_y = max(mid_y, y2)
-                
-                for y in range(start_y, end_y + 1):
-                    if grid[y][end_x] == ' ':
-                        grid[y][end_x] = '|'
-                    elif grid[y][end_x] == '-':
-                        grid[y][end_x] = '+'
+            if from_comp in comp_centers and to_comp in comp_centers:
+                x1, y1 = comp_centers[from_comp]
+                x2, y2 = comp_centers[to_comp]
+                lines.append(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"/>\n')
+                line_labels.append(
+                    f'<text x="{(x1 + x2) / 2}" y="{(y1 + y2) / 2}" text-anchor="middle" '
+                    f'dominant-baseline="middle" font-size="10">'
+                    f'{escape(f"{from_pin} → {to_pin}")}</text>\n'
+                )
         
-        # Convert grid to string
-        ascii_art = ""
-        for row in grid:
-            ascii_art += ''.join(row) + '\n'
+        # Shapes first, then wires on top, then labels on top of everything
+        parts.extend(shapes)
+        parts.append('<g stroke="black" stroke-width="1.5" stroke-opacity="0.6">\n')
+        parts.extend(lines)
+        parts.append('</g>\n')
+        parts.extend(labels)
+        if len(line_labels) <= MAX_CONNECTION_LABELS:
+            parts.extend(line_labels)
+        parts.append('</svg>\n')
+        
+        _write_bytes(paths.svg, "".join(parts).encode('utf-8'))
         
-        return ascii_art
+        return {
+            "success": True,
+            "schematic_id": schematic_id,
+            "svg_file_path": paths.svg,
+            "schematic_type": "svg"
+        }
     
-    def _generate_visual_schematic(self, netlist, schematic_id):
-        """Generate a visual schematic using matplotlib"""
+    def _generate_visual_schematic(self, netlist, schematic_id, paths, desc_parts):
+        """Generate a visual schematic using matplotlib.
+        
+        Description lines for the components and connections are appended to desc_parts.
+        """
         try:
-            import matplotlib.pyplot as plt
+            plt, imsave, Rectangle, Circle, PatchCollection, LineCollection = _load_matplotlib()
             import numpy as np
-            from matplotlib.patches import Rectangle, Circle, Arrow
             
             components = netlist.get("components", [])
-            connections = netlist.get("connections", [])
+            connections = netlist["_flat_conns"]
             
-            # Create figure
-            fig, ax = plt.figure(figsize=(12, 8)), plt.gca()
-            ax.set_xlim(0, 1000)
-            ax.set_ylim(0, 1000)
+            # Create figure; the axes fill it exactly, so saving needs no tight-bbox pass
+            fig = plt.figure(figsize=(10, 10))
+            ax = fig.add_axes([0, 0, 1, 1])
+            ax.set_xlim(0, CANVAS_SIZE)
+            ax.set_ylim(0, CANVAS_SIZE)
             ax.set_aspect('equal')
             ax.axis('off')
             
-            # Component shapes and colors by type
-            comp_shapes = {
-                "MICROCONTROLLER": {"shape": "rectangle", "width": 120, "height": 120, "color": "lightblue"},
-                "MCU": {"shape": "rectangle", "width": 120, "height": 120, "color": "lightblue"},
-                "SENSOR": {"shape": "rectangle", "width": 80, "height": 40, "color": "lightgreen"},
-                "LED": {"shape": "circle", "radius": 20, "color": "yellow"},
-                "RESISTOR": {"shape": "rectangle", "width": 60, "height": 20, "color": "beige"},
-                "CAPACITOR": {"shape": "rectangle", "width": 40, "height": 20, "color": "lightgray"},
-                "TRANSISTOR": {"shape": "circle", "radius": 25, "color": "lightcoral"},
-                "SWITCH": {"shape": "rectangle", "width": 60, "height": 30, "color": "lightpink"},
-                "default": {"shape": "rectangle", "width": 80, "height": 40, "color": "white"}
-            }
+            # Collect shapes and lines so each kind is drawn as a single collection
+            rects, rect_colors = [], []
+            circles, circle_colors = [], []
+            lines, line_labels = [], []
             
             # Draw components
             comp_centers = {}
-            for comp in components:
+            default_positions = None
+            for i, comp in enumerate(components):
                 comp_id = comp.get("id", "")
-                comp_type = comp.get("type", "default").upper()
+                comp_type = comp.get("type", "").upper()
                 comp_value = comp.get("value", "")
+                desc_parts.append(_describe_component(comp_id, comp_type, comp_value))
                 
                 # Get position or assign default
                 if "position" in comp and "x" in comp["position"] and "y" in comp["position"]:
                     x = comp["position"]["x"]
                     y = comp["position"]["y"]
                 else:
-                    # Assign random position if not specified
-                    x = np.random.randint(100, 900)
-                    y = np.random.randint(100, 900)
+                    # Assign a grid position if not specified
+                    if default_positions is None:
+                        default_positions = _default_positions(len(components))
+                    x, y = default_positions[i]
                 
                 # Get component visual properties
-                shape_info = comp_shapes.get(comp_type, comp_shapes["default"])
+                shape = _SHAPES[_SHAPE_IDX.get(comp_type, _DEFAULT_SHAPE_IDX)]
                 
                 # Draw component
-                if shape_info["shape"] == "rectangle":
-                    width, height = shape_info["width"], shape_info["height"]
-                    rect = Rectangle((x-width/2, y-height/2), width, height, 
-                                    facecolor=shape_info["color"], edgecolor='black', alpha=0.7)
-                    ax.add_patch(rect)
+                if shape.shape == "rectangle":
+                    width, height = shape.width, shape.height
+                    rects.append(Rectangle((x-width/2, y-height/2), width, height))
+                    rect_colors.append(shape.color)
                     comp_centers[comp_id] = (x, y)
-                elif shape_info["shape"] == "circle":
-                    radius = shape_info["radius"]
-                    circle = Circle((x, y), radius, facecolor=shape_info["color"], 
-                                    edgecolor='black', alpha=0.7)
-                    ax.add_patch(circle)
+                elif shape.shape == "circle":
+                    radius = shape.radius
+                    circles.append(Circle((x, y), radius))
+                    circle_colors.append(shape.color)
                     comp_centers[comp_id] = (x, y)
                 
                 # Add component label
@@ -566,39 +983,51 @@ class SchematicTool(BaseTool):
                 ax.text(x, y, label, ha='center', va='center', fontsize=9)
             
             # Draw connections
-            for conn in connections:
-                # 获取连接的两端（预处理后应该都是字典格式）
-                from_comp = conn.get("from", {}).get("component", "")
-                from_pin = conn.get("from", {}).get("pin", "")
-                to_comp = conn.get("to", {}).get("component", "")
-                to_pin = conn.get("to", {}).get("pin", "")
+            desc_parts.append(DESCRIPTION_CONNECTIONS)
+            for from_comp, from_pin, to_comp, to_pin in connections:
+                desc_parts.append(f"- {from_comp}.{from_pin} connected to {to_comp}.{to_pin}\n")
                 
                 if from_comp in comp_centers and to_comp in comp_centers:
                     x1, y1 = comp_centers[from_comp]
                     x2, y2 = comp_centers[to_comp]
                     
-                    # Draw line
-                    plt.plot([x1, x2], [y1, y2], 'k-', linewidth=1.5, alpha=0.6)
-                    
-                    # Add connection label (pin names) at midpoint
-                    mid_x, mid_y = (x1 + x2) / 2, (y1 + y2) / 2
-                    conn_label = f"{from_pin} → {to_pin}"
+                    lines.append([(x1, y1), (x2, y2)])
+                    # Connection label (pin names) at midpoint
+                    line_labels.append(((x1 + x2) / 2, (y1 + y2) / 2, f"{from_pin} → {to_pin}"))
+            
+            if rects:
+                ax.add_collection(PatchCollection(rects, facecolors=rect_colors, edgecolor='black', alpha=0.7))
+            if circles:
+                ax.add_collection(PatchCollection(circles, facecolors=circle_colors, edgecolor='black', alpha=0.7))
+            if lines:
+                ax.add_collection(LineCollection(lines, colors='k', linewidths=1.5, alpha=0.6))
+            
+            # Pin labels become unreadable clutter on dense netlists, so skip them there
+            if len(line_labels) <= MAX_CONNECTION_LABELS:
+                for mid_x, mid_y, conn_label in line_labels:
                     ax.text(mid_x, mid_y, conn_label, fontsize=8, 
                             ha='center', va='center', 
                             bbox=dict(facecolor='white', alpha=0.7, boxstyle='round,pad=0.2'))
             
             # Add title
-            plt.title("Circuit Schematic")
+            fig.suptitle("Circuit Schematic")
             
-            # Save schematic image
-            png_path = os.path.join(self.output_dir, f"{schematic_id}.png")
-            plt.savefig(png_path, dpi=150, bbox_inches='tight')
+            # Rasterize once, then encode the PNG on a worker thread (Pillow releases
+            # the GIL while compressing) while this thread writes the SVG. savefig
+            # itself mutates the figure, so the two saves can't share it concurrently.
+            png_path = paths.png
+            svg_path = paths.svg
+            fig.set_dpi(150)
+            fig.canvas.draw()
+            rgba = np.asarray(fig.canvas.buffer_rgba()).copy()
+            png_future = _RENDER_POOL.submit(imsave, png_path, rgba, format='png')
             
             # Save as SVG for vector graphics
-            svg_path = os.path.join(self.output_dir, f"{schematic_id}.svg")
-            plt.savefig(svg_path, format='svg', bbox_inches='tight')
-            
-            plt.close()
+            try:
+                fig.savefig(svg_path, format='svg')
+            finally:
+                png_future.result()
+                plt.close(fig)
             
             return {
                 "success": True,
@@ -610,7 +1039,8 @@ class SchematicTool(BaseTool):
         except ImportError as e:
             # Fallback to text-based schematic if visualization libraries not available
             print(f"Visualization libraries not available: {str(e)}. Falling back to text-based schematic.")
-            text_schematic = self._generate_text_schematic(netlist, schematic_id)
+            desc_parts.clear()
+            text_schematic = self._generate_text_schematic(netlist, schematic_id, paths, desc_parts)
             text_schematic["note"] = "Matplotlib or numpy not available. Using text-based schematic instead."
             return text_schematic
         except Exception as e:
@@ -620,58 +1050,6 @@ class SchematicTool(BaseTool):
                 "error": f"Error generating visual schematic: {str(e)}"
             }
     
-    def _generate_schematic_description(self, netlist):
-        """Generate a textual description of the schematic"""
-        components = netlist.get("components", [])
-        connections = netlist.get("connections", [])
-        
-        # Start building the description
-        description = "This schematic includes the following components:\n"
-        
-        # List components
-        for comp in components:
-            comp_id = comp.get("id", "")
-            comp_type = comp.get("type", "").upper()
-            comp_value = comp.get("value", "")
-            
-            comp_str = f"- {comp_id} ({comp_type}"
-            if comp_value:
-                comp_str += f", {comp_value}"
-            comp_str += ")"
-            
-            description += comp_str + "\n"
-        
-        # List connections
-        description += "\nConnections:\n"
-        for conn in connections:
-            # 获取连接的两端
-            from_comp = ""
-            from_pin = ""
-            to_comp = ""
-            to_pin = ""
-            
-            # 处理 "from" 字段（已确保是字典格式）
-            if "from" in conn:
-                from_data = conn["from"]
-                if isinstance(from_data, dict):
-                    from_comp = from_data.get("component", "")
-                    from_pin = from_data.get("pin", "")
-            
-            # 处理 "to" 字段（已确保是字典格式）
-            if "to" in conn:
-                to_data = conn["to"]
-                if isinstance(to_data, dict):
-                    to_comp = to_data.get("component", "")
-                    to_pin = to_data.get("pin", "")
-            
-            description += f"- {from_comp}.{from_pin} connected to {to_comp}.{to_pin}\n"
-        
-        # Add a general description
-        description += "\nCircuit description:\n"
-        description += "This circuit represents a schematic design with the specified components and connections."
-        
-        return description
-        
     # For compatibility with langchain newer versions
     def _run(self, input_str: str) -> str:
         return self._tool_run(input_str)
@@ -688,7 +1066,7 @@ def generate_schematic(netlist: Dict) -> Dict:
     """
     schematic_tool = SchematicTool()
     result_json = schematic_tool._tool_run(json.dumps(netlist))
-    return json.loads(result_json)
+    return _loads(result_json)
 
 
 if __name__ == "__main__":
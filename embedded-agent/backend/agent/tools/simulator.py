@@ -1,12 +1,300 @@
+import asyncio
+import functools
+import itertools
 import os
 import subprocess
 import json
 import time
-from typing import Dict, List, Optional, Any, Union
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, ClassVar, Dict, List, Optional, Set, Tuple, Union
 import shutil
 
 from langchain.tools.base import BaseTool
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+
+if HAS_ORJSON:
+    _loads = orjson.loads
+    _JSON_DECODE_ERRORS = (orjson.JSONDecodeError, ValueError)
+
+    def _dumps(obj: Any) -> str:
+        """Serialize a tool response as indented JSON."""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+
+    def _dumps_bytes(obj: Any) -> bytes:
+        """Serialize obj as compact UTF-8 JSON."""
+        return orjson.dumps(obj)
+else:
+    _loads = json.loads
+    _JSON_DECODE_ERRORS = (json.JSONDecodeError, ValueError)
+
+    def _dumps(obj: Any) -> str:
+        """Serialize a tool response as indented JSON."""
+        return json.dumps(obj, indent=2)
+
+    def _dumps_bytes(obj: Any) -> bytes:
+        """Serialize obj as compact UTF-8 JSON."""
+        return json.dumps(obj, ensure_ascii=False).encode()
+
+
+def _pack(obj: Any, human: bool, pretty: bool = False) -> Union[str, bytes]:
+    """Serialize a tool response.
+    
+    Responses for the LLM (human=True) are JSON text, indented if pretty is set;
+    responses for internal callers are MessagePack, or compact JSON bytes without msgpack.
+    """
+    if human:
+        return _dumps(obj) if pretty else _dumps_bytes(obj).decode()
+    if HAS_MSGPACK:
+        return msgpack.packb(obj)
+    return _dumps_bytes(obj)
+
+
+def _unpack(data: bytes) -> Any:
+    """Deserialize a response produced by _pack(obj, human=False)."""
+    if HAS_MSGPACK:
+        return msgpack.unpackb(data)
+    return _loads(data)
+
+
+# Top-level keys of a Proteus results file (see scripts/parse_proteus_results.py)
+RESULT_KEYS = frozenset(("success", "timestamp", "signals", "logic_analyzer", "uart_output", "notes"))
+
+# Results files at least this large are stream-parsed with ijson
+STREAM_MIN_BYTES = 64 * 1024
+
+
+def _read_sim_results(path: str) -> Dict:
+    """Read the RESULT_KEYS entries of a Proteus results file."""
+    if HAS_IJSON and os.path.getsize(path) >= STREAM_MIN_BYTES:
+        with open(path, 'rb') as f:
+            return {
+                key: value
+                for key, value in ijson.kvitems(f, '', use_float=True)
+                if key in RESULT_KEYS
+            }
+    
+    sim_results = _load_json_fast(path)
+    return {key: value for key, value in sim_results.items() if key in RESULT_KEYS}
+
+
+def _load_json_fast(path: str) -> Dict:
+    """Parse a file holding a JSON object.
+    
+    The first byte is checked before reading the rest, so error output that
+    Proteus leaves in place of results fails without a full parse.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        remaining = os.fstat(fd).st_size
+        head = os.read(fd, 1)
+        if head != b'{':
+            raise ValueError(f"{path} does not contain a JSON object")
+        
+        chunks = [head]
+        remaining -= 1
+        while remaining > 0:
+            chunk = os.read(fd, remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+    finally:
+        os.close(fd)
+    return _loads(b"".join(chunks))
+
+
+# Mock reading for a sensor, by substrings of its upper-cased type (first match wins)
+SENSOR_READINGS = (
+    (("TEMP", "LM35"), "25.5°C"),
+    (("LIGHT", "LDR"), "450 lux"),
+    (("HUMID", "DHT"), "45% RH"),
+)
+DEFAULT_SENSOR_READING = "1.25V"
+
+
+@functools.lru_cache(maxsize=256)
+def _mock_plan(comp_types: Tuple[str, ...]):
+    """Work out which components the mock simulation reports on.
+    
+    Agents tend to re-simulate the same netlist, so this is cached on its
+    sequence of component types.
+    
+    Returns:
+        (indices of the LEDs, (index, reading) pairs for the sensors)
+    """
+    led_indices = []
+    sensor_plan = []
+    for index, comp_type in enumerate(comp_types):
+        comp_type = comp_type.upper()
+        role = _component_role(comp_type)
+        if role == "led":
+            led_indices.append(index)
+        elif role == "sensor":
+            reading = next(
+                (reading for fragments, reading in SENSOR_READINGS
+                 if any(fragment in comp_type for fragment in fragments)),
+                DEFAULT_SENSOR_READING
+            )
+            sensor_plan.append((index, reading))
+    return tuple(led_indices), tuple(sensor_plan)
+
+
+# Minimal Intel HEX image used when no firmware is given
+_DUMMY_HEX = b":100000000200300000000000000000000000000000C6\n:00000001FF\n"
+
+
+def _ensure_dummy_hex(path: str) -> None:
+    """Write the dummy firmware to path unless it is already there."""
+    if os.path.exists(path):
+        return
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, _DUMMY_HEX)
+    finally:
+        os.close(fd)
+
+
+# Role of a component in the mock simulation, by upper-cased type. Types not
+# listed are matched by substring against FUZZY_ROLES, in order.
+TYPE_TO_ROLE = {
+    "MCU": "mcu",
+    "MICROCONTROLLER": "mcu",
+    "AT89C51": "mcu",
+    "LED": "led",
+    "SENSOR": "sensor",
+}
+FUZZY_ROLES = (("AT89C51", "mcu"), ("8051", "mcu"), ("SENSOR", "sensor"))
+
+
+def _component_role(comp_type: str) -> Optional[str]:
+    """Classify an upper-cased component type as "mcu", "led", "sensor" or None."""
+    role = TYPE_TO_ROLE.get(comp_type)
+    if role is None:
+        for fragment, fuzzy_role in FUZZY_ROLES:
+            if fragment in comp_type:
+                return fuzzy_role
+    return role
+
+
+# Simulation IDs combine the wall-clock time, the process ID and a per-process
+# counter, so simulations started at the same moment (e.g. in a batch, or in
+# another worker) never share files, and IDs stay unique across restarts
+_sim_counter = itertools.count()
+
+
+def _new_sim_id() -> str:
+    """Return a new simulation ID, unique across restarts and worker processes."""
+    return f"{time.time_ns():x}_{os.getpid():x}_{next(_sim_counter)}"
+
+
+# One prepared simulation: the netlist and firmware plus the files it reads and writes
+# (netlist_json is the netlist serialized once as compact JSON bytes, and
+# netlist_saved is the pending write of its reference copy)
+SimJob = namedtuple("SimJob", "netlist netlist_json firmware_hex dsn_path sim_output_path sim_id netlist_saved")
+
+# Writes reference files while the simulation subprocesses run
+_IO_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="simulator-io")
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """Write data to path, replacing any existing file."""
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+# Proteus runs from sync code are killed after this long, so a hung one can't
+# hold its thread (e.g. an agent worker's) past the server's task timeout
+PROCESS_TIMEOUT_SECONDS = float(os.environ.get("TASK_TIMEOUT_SECONDS", 1800))
+
+
+async def _exec(cmd: List[str], input: Optional[bytes] = None):
+    """Run cmd without blocking the event loop, feeding it input on stdin if given.
+    
+    The process is killed if the awaiting task is cancelled.
+    Returns (returncode, stdout, stderr), with the output as bytes.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if input is not None else None,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await process.communicate(input)
+    except asyncio.CancelledError:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        raise
+    return process.returncode, stdout, stderr
+
+
+# Proteus on PATH, resolved once at import (PATHEXT makes "PDS" match PDS.EXE on Windows)
+PROTEUS_ON_PATH = shutil.which("PDS") or shutil.which("proteus")
+
+# Where Proteus is usually installed, tried after the configured path
+COMMON_PROTEUS_LOCATIONS = (
+    "C:/Program Files (x86)/Labcenter Electronics/Proteus 8 Professional/BIN/PDS.EXE",
+    "C:/Program Files/Labcenter Electronics/Proteus 8 Professional/BIN/PDS.EXE",
+    "/Applications/Proteus 8 Professional/BIN/PDS.app",
+    "/usr/local/bin/proteus"
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _locate_proteus(preferred_path: str) -> Optional[str]:
+    """Find the Proteus executable, trying preferred_path first.
+    
+    The filesystem is only searched once per process for each preferred path,
+    with one stat per distinct candidate.
+    """
+    for location in dict.fromkeys((preferred_path, *COMMON_PROTEUS_LOCATIONS)):
+        try:
+            os.stat(location)
+        except OSError:
+            continue
+        print(f"Proteus found at: {location}")
+        return location
+    
+    return None
+
+
+@dataclass
+class _SimCfg:
+    """Plain snapshot of a SimulatorTool's settings, read on every simulation."""
+    # Explicit __slots__ rather than dataclass(slots=True), which needs 3.10 (Docker image is 3.9)
+    __slots__ = ("output_dir", "out_prefix", "scripts_dir", "template_dsn_path",
+                 "proteus_path", "proteus_available")
+    output_dir: str
+    out_prefix: str
+    scripts_dir: str
+    template_dsn_path: str
+    proteus_path: str
+    proteus_available: bool
+
+
 class SimulatorTool(BaseTool):
     """Tool for simulating 8051 circuits using Proteus."""
     
@@ -20,8 +308,12 @@ class SimulatorTool(BaseTool):
     output_dir: str = "backend/outputs"
     scripts_dir: str = "backend/scripts"
     template_dsn_path: str = "backend/scripts/template.dsn"
-    proteus_path: str = "C:/Program Files (x86)/Labcenter Electronics/Proteus 8 Professional/BIN/PDS.EXE"
+    proteus_path: str = PROTEUS_ON_PATH or "C:/Program Files (x86)/Labcenter Electronics/Proteus 8 Professional/BIN/PDS.EXE"
     proteus_available: bool = False
+    _cfg: Optional[_SimCfg] = None
+    
+    # Output directories already created by this process
+    _dirs_made: ClassVar[Set[str]] = set()
     
     def __init__(
         self, 
@@ -49,37 +341,47 @@ class SimulatorTool(BaseTool):
         if proteus_path:
             self.proteus_path = proteus_path
         
-        # Create output directory if it doesn't exist
-        os.makedirs(self.output_dir, exist_ok=True)
+        # Create output directory if it doesn't exist (once per directory per process)
+        if self.output_dir not in SimulatorTool._dirs_made:
+            os.makedirs(self.output_dir, exist_ok=True)
+            SimulatorTool._dirs_made.add(self.output_dir)
         
         # Check if Proteus is available
         self.proteus_available = self._check_proteus_available()
         if not self.proteus_available:
             print("WARNING: Proteus simulator not found. Simulation will be simulated.")
+        
+        self._snapshot_cfg()
+    
+    def _snapshot_cfg(self) -> None:
+        """Copy the settings used while simulating into _cfg."""
+        # Settings used while simulating, read without going through the pydantic model
+        # (set with object.__setattr__: pydantic v1 models reject undeclared underscore attributes)
+        object.__setattr__(self, "_cfg", _SimCfg(
+            output_dir=self.output_dir,
+            out_prefix=os.path.join(self.output_dir, ""),
+            scripts_dir=self.scripts_dir,
+            template_dsn_path=self.template_dsn_path,
+            proteus_path=self.proteus_path,
+            proteus_available=self.proteus_available
+        ))
+    
+    def set_output_dir(self, output_dir: str) -> None:
+        """Store later simulations' results in output_dir (created if missing)."""
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self._snapshot_cfg()
     
     def _check_proteus_available(self) -> bool:
         """Check if Proteus is available"""
-        if os.path.exists(self.proteus_path):
-            print(f"Proteus found at: {self.proteus_path}")
-            return True
-        
-        # Try to find Proteus in common locations
-        common_locations = [
-            "C:/Program Files (x86)/Labcenter Electronics/Proteus 8 Professional/BIN/PDS.EXE",
-            "C:/Program Files/Labcenter Electronics/Proteus 8 Professional/BIN/PDS.EXE",
-            "/Applications/Proteus 8 Professional/BIN/PDS.app",
-            "/usr/local/bin/proteus"
-        ]
-        
-        for location in common_locations:
-            if os.path.exists(location):
-                self.proteus_path = location
-                print(f"Proteus found at: {self.proteus_path}")
-                return True
+        location = _locate_proteus(self.proteus_path)
+        if location is None:
+            return False
         
-        return False
+        self.proteus_path = location
+        return True
     
-    def _tool_run(self, input_str: str) -> str:
+    def _tool_run(self, input_str: str, _pretty: bool = False) -> str:
         """Run the simulator tool.
         
         Args:
@@ -98,178 +400,319 @@ class SimulatorTool(BaseTool):
                     },
                     "firmware_hex": "path/to/firmware.hex"
                 }
+            _pretty: Indent the returned JSON (used for the LLM-visible _run path).
             
         Returns:
             JSON string with simulation results.
         """
+        # Parse input
         try:
-            # Parse input
-            try:
-                input_data = json.loads(input_str)
-            except json.JSONDecodeError:
-                return json.dumps({
-                    "success": False,
-                    "message": "Invalid input format",
-                    "error": "Input is not a valid JSON string"
-                }, indent=2)
-                
-            netlist = input_data.get("netlist", {})
-            firmware_hex = input_data.get("firmware_hex", "")
-            
-            # Validate input
-            if not netlist:
-                return json.dumps({
-                    "success": False,
-                    "message": "Missing required fields",
-                    "error": "Invalid input: netlist is required"
-                }, indent=2)
-            
-            # Check if firmware hex file exists - if not provided, use a dummy one for simulation
-            if not firmware_hex:
-                # Fall back to a default hex file if available, otherwise generate a message
-                default_hex = os.path.join(self.output_dir, "default_firmware.hex")
-                if os.path.exists(default_hex):
-                    firmware_hex = default_hex
-                    print(f"No firmware specified, using default: {default_hex}")
-                else:
-                    # Generate a simple dummy hex file
-                    firmware_hex = os.path.join(self.output_dir, "dummy_firmware.hex")
-                    with open(firmware_hex, 'w') as f:
-                        f.write(":100000000200300000000000000000000000000000C6\n:00000001FF\n")
-                    print(f"No firmware specified, created dummy hex: {firmware_hex}")
-            elif not os.path.exists(firmware_hex):
-                return json.dumps({
-                    "success": False,
-                    "message": "File not found",
-                    "error": f"Firmware HEX file not found: {firmware_hex}"
-                }, indent=2)
-            
-            # Check if Proteus is available - no need to return error, we'll use simulation
-            if not self.proteus_available:
-                print("Proteus simulator not found. Using simulated results.")
-            
-            # Prepare simulation files
-            sim_id = str(int(time.time()))
-            dsn_file = f"sim_{sim_id}.dsn"
-            dsn_path = os.path.join(self.output_dir, dsn_file)
-            sim_output_path = os.path.join(self.output_dir, f"sim_results_{sim_id}.json")
-            
-            # Save netlist for reference
-            netlist_path = os.path.join(self.output_dir, f"netlist_{sim_id}.json")
-            with open(netlist_path, 'w') as f:
-                json.dump(netlist, f, indent=2)
-            
-            # Call the update_proteus.py script to create the design file or simulate
-            result = self._run_proteus_simulation(netlist, firmware_hex, dsn_path, sim_output_path, sim_id)
-            
-            # 构建标准化的输出结构
-            if result.get("success", False):
-                return json.dumps({
-                    "success": True,
-                    "message": f"Simulation completed successfully with ID {sim_id}",
-                    "data": result
-                }, indent=2)
+            input_data = _loads(input_str)
+        except _JSON_DECODE_ERRORS:
+            return _pack({
+                "success": False,
+                "message": "Invalid input format",
+                "error": "Input is not a valid JSON string"
+            }, human=True, pretty=_pretty)
+        
+        return _pack(self._simulate(input_data), human=True, pretty=_pretty)
+    
+    async def _arun(self, input_str: str) -> str:
+        """Run the simulator tool like _run, awaiting Proteus so a cancelled run stops it."""
+        try:
+            input_data = _loads(input_str)
+        except _JSON_DECODE_ERRORS:
+            return _pack({
+                "success": False,
+                "message": "Invalid input format",
+                "error": "Input is not a valid JSON string"
+            }, human=True, pretty=True)
+        
+        return _pack(await self._asimulate(input_data), human=True, pretty=True)
+    
+    def _run_bin(self, input_data: Dict) -> bytes:
+        """Run a simulation for an internal caller; returns the packed response (see _unpack)."""
+        return _pack(self._simulate(input_data), human=False)
+    
+    def _tool_run_bytes(self, netlist_bytes: bytes, firmware_hex: str) -> Dict:
+        """Run a simulation on an already serialized netlist; returns the response structure.
+        
+        The netlist is parsed once, and netlist_bytes are reused as-is for the
+        reference copy and update_proteus.py instead of being re-encoded.
+        """
+        try:
+            netlist = _loads(netlist_bytes)
+        except _JSON_DECODE_ERRORS:
+            return {
+                "success": False,
+                "message": "Invalid input format",
+                "error": "Netlist is not a valid JSON string"
+            }
+        
+        return self._simulate({"netlist": netlist, "firmware_hex": firmware_hex}, netlist_bytes)
+    
+    def _simulate(self, input_data: Dict, netlist_json: Optional[bytes] = None) -> Dict:
+        """Run one simulation request and return the response structure.
+        
+        Invalid input is reported by _prepare_job's explicit checks; only file
+        errors are caught here, since the simulation itself handles its own.
+        """
+        try:
+            job, error = self._prepare_job(input_data, _new_sim_id(), netlist_json)
+        except OSError as e:
+            return self._io_failed(e)
+        if error:
+            return error
+        
+        # Call the update_proteus.py script to create the design file or simulate
+        result = self._run_proteus_simulation(job)
+        try:
+            job.netlist_saved.result()
+        except OSError as e:
+            return self._io_failed(e)
+        return self._format_result(result, job.sim_id)
+    
+    async def _asimulate(self, input_data: Dict) -> Dict:
+        """Async variant of _simulate, running Proteus with asyncio subprocesses."""
+        try:
+            job, error = self._prepare_job(input_data, _new_sim_id())
+        except OSError as e:
+            return self._io_failed(e)
+        if error:
+            return error
+        
+        result = await self._arun_proteus_simulation(job)
+        try:
+            await asyncio.wrap_future(job.netlist_saved)
+        except OSError as e:
+            return self._io_failed(e)
+        return self._format_result(result, job.sim_id)
+    
+    @staticmethod
+    def _io_failed(e: OSError) -> Dict:
+        """Error response for a simulation file that could not be read or written."""
+        return {
+            "success": False,
+            "message": "Error during simulation",
+            "error": str(e)
+        }
+    
+    def _prepare_job(self, input_data: Dict, sim_id: str, netlist_json: Optional[bytes] = None):
+        """Validate one simulation request and lay out its files.
+        
+        netlist_json is the netlist's JSON encoding, if the caller already has it.
+        
+        Returns:
+            (job, None) on success, or (None, error response) if the input is invalid.
+        """
+        cfg = self._cfg
+        if not isinstance(input_data, dict):
+            return None, {
+                "success": False,
+                "message": "Invalid input format",
+                "error": "Input must be a JSON object"
+            }
+        netlist = input_data.get("netlist", {})
+        firmware_hex = input_data.get("firmware_hex", "")
+        
+        # Validate input
+        if not isinstance(firmware_hex, str):
+            return None, {
+                "success": False,
+                "message": "Invalid input format",
+                "error": "firmware_hex must be a path string"
+            }
+        if not netlist:
+            return None, {
+                "success": False,
+                "message": "Missing required fields",
+                "error": "Invalid input: netlist is required"
+            }
+        
+        # Check if firmware hex file exists - if not provided, use a dummy one for simulation
+        if not firmware_hex:
+            # Fall back to a default hex file if available, otherwise generate a message
+            default_hex = os.path.join(cfg.output_dir, "default_firmware.hex")
+            if os.path.exists(default_hex):
+                firmware_hex = default_hex
+                print(f"No firmware specified, using default: {default_hex}")
             else:
-                return json.dumps({
-                    "success": False,
-                    "message": "Simulation failed", 
-                    "error": result.get("error", "Unknown error during simulation")
-                }, indent=2)
+                # Generate a simple dummy hex file
+                firmware_hex = os.path.join(cfg.output_dir, "dummy_firmware.hex")
+                _ensure_dummy_hex(firmware_hex)
+                print(f"No firmware specified, using dummy hex: {firmware_hex}")
+        elif not os.path.exists(firmware_hex):
+            return None, {
+                "success": False,
+                "message": "File not found",
+                "error": f"Firmware HEX file not found: {firmware_hex}"
+            }
         
-        except Exception as e:
-            return json.dumps({
+        # Check if Proteus is available - no need to return error, we'll use simulation
+        if not cfg.proteus_available:
+            print("Proteus simulator not found. Using simulated results.")
+        
+        # Prepare simulation files
+        dsn_path = f"{cfg.out_prefix}sim_{sim_id}.dsn"
+        sim_output_path = f"{cfg.out_prefix}sim_results_{sim_id}.json"
+        
+        # Save netlist for reference
+        netlist_path = f"{cfg.out_prefix}netlist_{sim_id}.json"
+        if netlist_json is None:
+            netlist_json = _dumps_bytes(netlist)
+        netlist_saved = _IO_POOL.submit(_write_bytes, netlist_path, netlist_json)
+        
+        return SimJob(netlist, netlist_json, firmware_hex, dsn_path, sim_output_path, sim_id, netlist_saved), None
+    
+    @staticmethod
+    def _format_result(result: Dict, sim_id: str) -> Dict:
+        """Wrap a simulation result in the standard response structure."""
+        # 构建标准化的输出结构
+        if result.get("success", False):
+            return {
+                "success": True,
+                "message": f"Simulation completed successfully with ID {sim_id}",
+                "data": result
+            }
+        else:
+            return {
+                "success": False,
+                "message": "Simulation failed", 
+                "error": result.get("error", "Unknown error during simulation")
+            }
+    
+    def _proteus_commands(self, job: "SimJob"):
+        """Build the update_proteus.py and simulation commands for a job."""
+        cfg = self._cfg
+        
+        # Call the update_proteus.py script to create the design file
+        script_path = os.path.join(cfg.scripts_dir, "update_proteus.py")
+        update_cmd = [
+            "python", script_path, 
+            "--template", cfg.template_dsn_path,
+            "--output", job.dsn_path,
+            "--netlist-stdin",
+            "--firmware", job.firmware_hex
+        ]
+        
+        # Run the simulation using the batch script
+        bat_script_path = os.path.join(cfg.scripts_dir, "run_simulation.bat")
+        sim_cmd = [
+            bat_script_path,
+            cfg.proteus_path,
+            job.dsn_path,
+            job.sim_output_path
+        ]
+        return update_cmd, sim_cmd
+    
+    @staticmethod
+    def _update_failed(stderr: bytes) -> Dict:
+        """Error result for a failed update_proteus.py run."""
+        return {
+            "success": False,
+            "error": f"Failed to create Proteus design file: {stderr.decode('utf-8', errors='replace')}"
+        }
+    
+    @staticmethod
+    def _collect_results(job: "SimJob", returncode: int, stdout: bytes, stderr: bytes) -> Dict:
+        """Check the simulation process and read the results it wrote.
+        
+        The process output is only decoded when the simulation failed.
+        """
+        # Check if simulation completed successfully
+        if returncode != 0 or not os.path.exists(job.sim_output_path):
+            return {
+                "success": False,
+                "error": f"Simulation failed: {stderr.decode('utf-8', errors='replace')}",
+                "stdout": stdout.decode('utf-8', errors='replace')
+            }
+        
+        # Read simulation results
+        try:
+            sim_results = _read_sim_results(job.sim_output_path)
+        except ValueError as e:
+            return {
                 "success": False,
-                "message": "Error during simulation",
-                "error": str(e)
-            }, indent=2)
+                "error": f"Invalid simulation results: {str(e)}"
+            }
+        
+        return {
+            "success": True,
+            "simulation_id": job.sim_id,
+            "dsn_file": job.dsn_path,
+            "results": sim_results
+        }
     
-    def _run_proteus_simulation(self, netlist, firmware_hex, dsn_path, sim_output_path, sim_id):
+    def _run_proteus_simulation(self, job: "SimJob") -> Dict:
         """Run the simulation using Proteus"""
         try:
             # Check if we can simulate, else fallback to mock simulation
-            if not self.proteus_available:
-                return self._simulate_proteus_results(netlist, firmware_hex, sim_id)
-                
-            # Call the update_proteus.py script to create the design file
-            script_path = os.path.join(self.scripts_dir, "update_proteus.py")
-            update_cmd = [
-                "python", script_path, 
-                "--template", self.template_dsn_path,
-                "--output", dsn_path,
-                "--netlist", json.dumps(netlist),
-                "--firmware", firmware_hex
-            ]
+            if not self._cfg.proteus_available:
+                return self._simulate_proteus_results(job.netlist, job.firmware_hex, job.sim_id)
+            
+            update_cmd, sim_cmd = self._proteus_commands(job)
             
             update_process = subprocess.run(
                 update_cmd,
+                input=job.netlist_json,
                 capture_output=True,
-                text=True,
-                check=False
+                check=False,
+                timeout=PROCESS_TIMEOUT_SECONDS
             )
             
             if update_process.returncode != 0:
-                return {
-                    "success": False,
-                    "error": f"Failed to create Proteus design file: {update_process.stderr}"
-                }
-            
-            # Run the simulation using the batch script
-            bat_script_path = os.path.join(self.scripts_dir, "run_simulation.bat")
-            sim_cmd = [
-                bat_script_path,
-                self.proteus_path,
-                dsn_path,
-                sim_output_path
-            ]
+                return self._update_failed(update_process.stderr)
             
             sim_process = subprocess.run(
                 sim_cmd,
                 capture_output=True,
-                text=True,
-                check=False
+                check=False,
+                timeout=PROCESS_TIMEOUT_SECONDS
             )
             
-            # Check if simulation completed successfully
-            if sim_process.returncode != 0 or not os.path.exists(sim_output_path):
-                return {
-                    "success": False,
-                    "error": f"Simulation failed: {sim_process.stderr}",
-                    "stdout": sim_process.stdout
-                }
-            
-            # Read simulation results
-            with open(sim_output_path, 'r') as f:
-                sim_results = json.load(f)
-            
+            return self._collect_results(job, sim_process.returncode, sim_process.stdout, sim_process.stderr)
+        except Exception as e:
             return {
-                "success": True,
-                "simulation_id": sim_id,
-                "dsn_file": dsn_path,
-                "results": sim_results
+                "success": False,
+                "error": f"Error during Proteus simulation: {str(e)}"
             }
+    
+    async def _arun_proteus_simulation(self, job: "SimJob") -> Dict:
+        """Asynchronous version of _run_proteus_simulation, for running several jobs at once."""
+        try:
+            if not self._cfg.proteus_available:
+                return self._simulate_proteus_results(job.netlist, job.firmware_hex, job.sim_id)
+            
+            update_cmd, sim_cmd = self._proteus_commands(job)
+            
+            returncode, _, stderr = await _exec(update_cmd, job.netlist_json)
+            if returncode != 0:
+                return self._update_failed(stderr)
+            
+            return self._collect_results(job, *await _exec(sim_cmd))
         except Exception as e:
             return {
                 "success": False,
                 "error": f"Error during Proteus simulation: {str(e)}"
             }
-            
+    
+    async def _arun_batch(self, jobs: List[Dict]) -> List[Dict]:
+        """Simulate several {"netlist", "firmware_hex"} jobs concurrently."""
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+        
+        async def run_one(input_data: Dict) -> Dict:
+            async with semaphore:
+                return await self._asimulate(input_data)
+        
+        return list(await asyncio.gather(*(run_one(job) for job in jobs)))
+    
     def _simulate_proteus_results(self, netlist, firmware_hex, sim_id):
         """Generate simulated results when Proteus is not available"""
         try:
             components = netlist.get("components", [])
-            mcu = None
-            leds = []
-            sensors = []
             
-            # Find key components
-            for comp in components:
-                comp_type = comp.get("type", "").upper()
-                if "AT89C51" in comp_type or "8051" in comp_type or comp_type == "MCU" or comp_type == "MICROCONTROLLER":
-                    mcu = comp
-                elif comp_type == "LED":
-                    leds.append(comp)
-                elif "SENSOR" in comp_type:
-                    sensors.append(comp)
+            # Find key components (cached per sequence of component types)
+            led_indices, sensor_plan = _mock_plan(tuple(comp.get("type", "") for comp in components))
             
             # Generate mock simulation results
             sim_results = {
@@ -300,28 +743,19 @@ class SimulatorTool(BaseTool):
                 }
             }
             
-            # Add LED states
-            if leds:
-                sim_results["results"]["led_states"] = {}
-                for i, led in enumerate(leds):
-                    # Simulate LED blinking
-                    sim_results["results"]["led_states"][led.get("id", f"LED{i+1}")] = "ON" if i % 2 == 0 else "OFF"
+            # Add LED states (simulate LED blinking)
+            if led_indices:
+                sim_results["results"]["led_states"] = {
+                    components[index].get("id", f"LED{i+1}"): "ON" if i % 2 == 0 else "OFF"
+                    for i, index in enumerate(led_indices)
+                }
             
             # Add sensor readings
-            if sensors:
-                sim_results["results"]["sensor_readings"] = {}
-                for i, sensor in enumerate(sensors):
-                    sensor_id = sensor.get("id", f"SENSOR{i+1}")
-                    sensor_type = sensor.get("type", "").upper()
-                    
-                    if "TEMP" in sensor_type or "LM35" in sensor_type:
-                        sim_results["results"]["sensor_readings"][sensor_id] = "25.5°C"
-                    elif "LIGHT" in sensor_type or "LDR" in sensor_type:
-                        sim_results["results"]["sensor_readings"][sensor_id] = "450 lux"
-                    elif "HUMID" in sensor_type or "DHT" in sensor_type:
-                        sim_results["results"]["sensor_readings"][sensor_id] = "45% RH"
-                    else:
-                        sim_results["results"]["sensor_readings"][sensor_id] = "1.25V"
+            if sensor_plan:
+                sim_results["results"]["sensor_readings"] = {
+                    components[index].get("id", f"SENSOR{i+1}"): reading
+                    for i, (index, reading) in enumerate(sensor_plan)
+                }
             
             return sim_results
             
@@ -333,7 +767,23 @@ class SimulatorTool(BaseTool):
     
     # For compatibility with langchain newer versions
     def _run(self, input_str: str) -> str:
-        return self._tool_run(input_str)
+        return self._tool_run(input_str, _pretty=True)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_simulator(
+    output_dir: Optional[str] = None,
+    scripts_dir: Optional[str] = None,
+    template_dsn_path: Optional[str] = None,
+    proteus_path: Optional[str] = None
+) -> SimulatorTool:
+    """Return a shared SimulatorTool for the given settings, creating it on first use."""
+    return SimulatorTool(
+        output_dir=output_dir,
+        scripts_dir=scripts_dir,
+        template_dsn_path=template_dsn_path,
+        proteus_path=proteus_path
+    )
 
 
 def run_simulation(netlist: Dict, firmware_hex: str) -> Dict:
@@ -346,13 +796,60 @@ def run_simulation(netlist: Dict, firmware_hex: str) -> Dict:
     Returns:
         Dictionary with simulation results.
     """
-    simulator_tool = SimulatorTool()
+    simulator_tool = _get_simulator()
     input_data = {
         "netlist": netlist,
         "firmware_hex": firmware_hex
     }
-    result_json = simulator_tool._tool_run(json.dumps(input_data))
-    return json.loads(result_json)
+    return _unpack(simulator_tool._run_bin(input_data))
+
+
+def run_simulation_raw(netlist_bytes: bytes, firmware_hex: str) -> Dict:
+    """Run a simulation on a netlist that is already serialized as JSON.
+    
+    Args:
+        netlist_bytes: JSON-encoded netlist.
+        firmware_hex: Path to the compiled firmware HEX file.
+        
+    Returns:
+        Dictionary with simulation results.
+    """
+    return _get_simulator()._tool_run_bytes(netlist_bytes, firmware_hex)
+
+
+def run_simulations_batch(jobs: List[Dict]) -> List[Dict]:
+    """Run several simulations concurrently.
+    
+    Args:
+        jobs: List of {"netlist": ..., "firmware_hex": ...} dictionaries, as for run_simulation.
+        
+    Returns:
+        List of simulation results, in the same order as jobs.
+        
+    Raises:
+        RuntimeError: If called from a running event loop (await
+            arun_simulations_batch there instead).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(arun_simulations_batch(jobs))
+    raise RuntimeError(
+        "run_simulations_batch() can't be called from a running event loop; "
+        "await arun_simulations_batch(jobs) instead"
+    )
+
+
+async def arun_simulations_batch(jobs: List[Dict]) -> List[Dict]:
+    """Run several simulations concurrently, from code already on an event loop.
+    
+    Args:
+        jobs: List of {"netlist": ..., "firmware_hex": ...} dictionaries, as for run_simulation.
+        
+    Returns:
+        List of simulation results, in the same order as jobs.
+    """
+    return await _get_simulator()._arun_batch(jobs)
 
 
 if __name__ == "__main__":
@@ -10,6 +10,14 @@ import os
 import sys
 from datetime import datetime
 
+import numpy as np
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 
 def parse_args():
     """Parse command line arguments."""
@@ -43,8 +51,11 @@ def parse_raw_results(raw_file_path):
     return generate_mock_results()
 
 
-def generate_mock_results():
-    """Generate mock simulation results for demonstration."""
+def generate_mock_results(num_samples=5):
+    """Generate mock simulation results for demonstration.
+    
+    Signal and logic analyzer traces are NumPy arrays of num_samples samples.
+    """
     return {
         "success": True,
         "timestamp": datetime.now().isoformat(),
@@ -53,18 +64,18 @@ def generate_mock_results():
                 "node": "NODE1",
                 "component": "LM35",
                 "pin": "Vout",
-                "values": [0.25, 0.251, 0.252, 0.253, 0.255]  # 25°C in volts (10mV/°C)
+                "values": np.linspace(0.25, 0.255, num_samples, dtype=np.float32)  # 25°C in volts (10mV/°C)
             },
             "LED1.Anode": {
                 "node": "NODE2",
                 "component": "LED1",
                 "pin": "Anode",
-                "values": [0.0, 0.0, 0.0, 0.0, 0.0]  # LED off at 25°C
+                "values": np.zeros(num_samples, dtype=np.float32)  # LED off at 25°C
             }
         },
         "logic_analyzer": {
-            "channel_0": [0, 0, 0, 0, 0],  # LED state
-            "channel_1": [0, 0, 0, 0, 0]   # Fan state
+            "channel_0": np.zeros(num_samples, dtype=np.uint8),  # LED state
+            "channel_1": np.zeros(num_samples, dtype=np.uint8)   # Fan state
         },
         "uart_output": "Temperature: 25.0°C\nTemperature: 25.1°C\nTemperature: 25.2°C\nTemperature: 25.3°C\nTemperature: 25.5°C\n",
         "notes": [
@@ -74,11 +85,22 @@ def generate_mock_results():
     }
 
 
+def _numpy_default(obj):
+    """json.dump fallback for the NumPy arrays in the results."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
 def write_json_results(results, output_file_path):
     """Write results dictionary to a JSON file."""
     try:
-        with open(output_file_path, 'w') as f:
-            json.dump(results, f, indent=2)
+        if HAS_ORJSON:
+            with open(output_file_path, 'wb') as f:
+                f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(output_file_path, 'w') as f:
+                json.dump(results, f, indent=2, default=_numpy_default)
         return True
     except Exception as e:
         print(f"Error writing JSON file: {e}", file=sys.stderr)
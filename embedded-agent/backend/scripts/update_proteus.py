@@ -4,20 +4,42 @@ Script to update Proteus design files (.dsn) based on a netlist and firmware.
 """
 
 import argparse
+import functools
 import json
 import os
 import re
-import shutil
+import sys
 import xml.etree.ElementTree as ET
 from typing import Dict, List, Optional, Any
 
+# DSN sections, compiled once at import
+COMPONENTS_SECTION_RE = re.compile(r'(CIRCUIT.*?ENDCIRCUIT)', re.DOTALL)
+CONNECTIONS_SECTION_RE = re.compile(r'(WIRE.*?ENDWIRE)', re.DOTALL)
+HEXFILE_RE = re.compile(r'(HEXFILE.*?)(\n|$)')
+
+# Component mapping to Proteus model names
+COMPONENT_MODELS = {
+    "AT89C51": "AT89C51",
+    "LED": "LED-RED",
+    "Resistor": "RES",
+    "Crystal": "CRYSTAL",
+    "Capacitor": "CAP",
+    "LM35": "LM35",
+    "DC_Motor": "MOTOR",
+    "L293D": "L293D",
+    "ADC0804": "ADC0804"
+}
+
 
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="Update Proteus design files")
     parser.add_argument("--template", required=True, help="Path to template DSN file")
     parser.add_argument("--output", required=True, help="Path to output DSN file")
-    parser.add_argument("--netlist", required=True, help="JSON string with netlist")
+    netlist_source = parser.add_mutually_exclusive_group(required=True)
+    netlist_source.add_argument("--netlist", help="JSON string with netlist")
+    netlist_source.add_argument("--netlist-stdin", action="store_true",
+                                help="Read the netlist JSON from standard input")
     parser.add_argument("--firmware", required=True, help="Path to firmware HEX file")
     return parser.parse_args()
 
@@ -40,11 +62,9 @@ def update_proteus_design(
         True if successful, False otherwise.
     """
     try:
-        # Copy the template file to the output location
-        shutil.copy2(template_path, output_path)
-        
-        # Read the DSN file as text (it's not pure XML)
-        with open(output_path, 'r') as f:
+        # Read the template as text (it's not pure XML); the output is only
+        # written once, after every update has been applied in memory
+        with open(template_path, 'r') as f:
             dsn_content = f.read()
         
         # 1. Update components section
@@ -64,7 +84,7 @@ def update_proteus_design(
         # 4. Add virtual instruments (Logic Analyzer, UART Terminal)
         dsn_content = add_virtual_instruments(dsn_content)
         
-        # Write the updated content back to the file
+        # Write the updated design to the output location
         with open(output_path, 'w') as f:
             f.write(dsn_content)
         
@@ -86,37 +106,37 @@ def add_components_to_dsn(dsn_content: str, components: List[Dict[str, Any]]) ->
         Updated DSN content.
     """
     # Find the components section in the DSN file
-    components_section_pattern = r'(CIRCUIT.*?ENDCIRCUIT)'
-    match = re.search(components_section_pattern, dsn_content, re.DOTALL)
+    match = COMPONENTS_SECTION_RE.search(dsn_content)
     
     if not match:
         print("Components section not found in DSN file")
         return dsn_content
     
     components_section = match.group(1)
-    new_components_section = components_section
     
-    # Add each component to the section
+    # Generate each component's entry in Proteus format
+    entries = []
     for component in components:
-        component_type = component.get("type", "")
-        component_id = component.get("id", "")
-        position = component.get("position", {"x": 0, "y": 0})
-        value = component.get("value", "")
-        
-        # Generate component entry in Proteus format
         component_entry = generate_proteus_component_entry(
-            component_type, component_id, position, value
+            component.get("type", ""),
+            component.get("id", ""),
+            component.get("position", {"x": 0, "y": 0}),
+            component.get("value", "")
         )
-        
         if component_entry:
-            # Add the component before the ENDCIRCUIT tag
-            new_components_section = new_components_section.replace(
-                "ENDCIRCUIT", 
-                f"{component_entry}\nENDCIRCUIT"
-            )
+            entries.append(component_entry)
+    
+    if not entries:
+        return dsn_content
+    
+    # Add all the components before the ENDCIRCUIT tag in one splice
+    new_components_section = components_section.replace(
+        "ENDCIRCUIT",
+        "\n".join(entries) + "\nENDCIRCUIT"
+    )
     
-    # Replace the old components section with the new one
-    dsn_content = dsn_content.replace(components_section, new_components_section)
+    # Splice the new components section in at the matched offsets
+    dsn_content = dsn_content[:match.start(1)] + new_components_section + dsn_content[match.end(1):]
     
     return dsn_content
 
@@ -138,20 +158,7 @@ def generate_proteus_component_entry(
     Returns:
         Component entry string for the DSN file.
     """
-    # Component mapping to Proteus model names
-    component_models = {
-        "AT89C51": "AT89C51",
-        "LED": "LED-RED",
-        "Resistor": "RES",
-        "Crystal": "CRYSTAL",
-        "Capacitor": "CAP",
-        "LM35": "LM35",
-        "DC_Motor": "MOTOR",
-        "L293D": "L293D",
-        "ADC0804": "ADC0804"
-    }
-    
-    model = component_models.get(component_type)
+    model = COMPONENT_MODELS.get(component_type)
     if not model:
         print(f"Unknown component type: {component_type}")
         return ""
@@ -162,17 +169,20 @@ def generate_proteus_component_entry(
     # Generate a unique reference if ID is not provided
     ref = component_id or f"{component_type[0]}{1}"
     
+    return _entry_template(model, str(value) if value else "").format(ref=ref, x=x, y=y)
+
+
+@functools.lru_cache(maxsize=256)
+def _entry_template(model: str, value: str) -> str:
+    """Component entry template for a model/value pair, with ref and position left to fill in."""
     # Basic component entry template
-    entry = f"""
-COMPONENT {ref} {model}
-SHEET 1 {x} {y}
-PROP Ref {ref}"""
+    template = "\nCOMPONENT {ref} " + model + "\nSHEET 1 {x} {y}\nPROP Ref {ref}"
     
     # Add value property if provided
     if value:
-        entry += f"\nPROP Value {value}"
+        template += "\nPROP Value " + value.replace("{", "{{").replace("}", "}}")
     
-    return entry
+    return template
 
 
 def extract_connections_from_components(components: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -221,8 +231,7 @@ def add_connections_to_dsn(dsn_content: str, connections: List[Dict[str, Any]])
         Updated DSN content.
     """
     # Find the connections section in the DSN file
-    connections_section_pattern = r'(WIRE.*?ENDWIRE)'
-    match = re.search(connections_section_pattern, dsn_content, re.DOTALL)
+    match = CONNECTIONS_SECTION_RE.search(dsn_content)
     
     # If no connections section exists, create one before ENDCIRCUIT
     if not match:
@@ -232,13 +241,13 @@ def add_connections_to_dsn(dsn_content: str, connections: List[Dict[str, Any]])
         )
         
         # Search again for the newly created section
-        match = re.search(connections_section_pattern, dsn_content, re.DOTALL)
+        match = CONNECTIONS_SECTION_RE.search(dsn_content)
         if not match:
             print("Failed to create connections section")
             return dsn_content
     
     connections_section = match.group(1)
-    new_connections_section = connections_section.replace("ENDWIRE", "")
+    wires = [connections_section.replace("ENDWIRE", "")]
     
     # Add each connection to the section
     for connection in connections:
@@ -249,13 +258,13 @@ def add_connections_to_dsn(dsn_content: str, connections: List[Dict[str, Any]])
         
         if from_comp and from_pin and to_comp and to_pin:
             # Generate connection entry in Proteus format
-            connection_entry = f"WIRE {from_comp} {from_pin} {to_comp} {to_pin}"
-            new_connections_section += connection_entry + "\n"
+            wires.append(f"WIRE {from_comp} {from_pin} {to_comp} {to_pin}\n")
     
-    new_connections_section += "ENDWIRE"
+    wires.append("ENDWIRE")
+    new_connections_section = "".join(wires)
     
-    # Replace the old connections section with the new one
-    dsn_content = dsn_content.replace(connections_section, new_connections_section)
+    # Splice the new connections section in at the matched offsets
+    dsn_content = dsn_content[:match.start(1)] + new_connections_section + dsn_content[match.end(1):]
     
     return dsn_content
 
@@ -271,12 +280,9 @@ def update_firmware_path(dsn_content: str, firmware_path: str) -> str:
         Updated DSN content.
     """
     # Find the firmware section in the DSN file
-    firmware_pattern = r'(HEXFILE.*?)(\n|$)'
-    
     # If a firmware section exists, replace it
-    if re.search(firmware_pattern, dsn_content):
-        dsn_content = re.sub(
-            firmware_pattern,
+    if HEXFILE_RE.search(dsn_content):
+        dsn_content = HEXFILE_RE.sub(
             f'HEXFILE "{os.path.abspath(firmware_path)}"\n',
             dsn_content
         )
@@ -319,12 +325,6 @@ PROP StopBits 1
 PROP Parity None
 """
     
-    # Add the virtual instruments before ENDCIRCUIT
-    dsn_content = dsn_content.replace(
-        "ENDCIRCUIT",
-        f"{logic_analyzer}\n{uart_terminal}\nENDCIRCUIT"
-    )
-    
     # Add connections for virtual instruments (UART to P3.0/P3.1, Logic Analyzer to relevant pins)
     uart_connections = """
 WIRE TERM1 TX AT89C51 P3.0
@@ -338,15 +338,30 @@ WIRE LA1 D2 AT89C51 P1.2
 WIRE LA1 D3 AT89C51 P1.3
 """
     
-    # Add the connections to the WIRE section
-    wire_section_pattern = r'(WIRE.*?)ENDWIRE'
-    if re.search(wire_section_pattern, dsn_content, re.DOTALL):
-        dsn_content = re.sub(
-            wire_section_pattern,
-            f'\\1{uart_connections}\n{logic_analyzer_connections}\nENDWIRE',
-            dsn_content,
-            flags=re.DOTALL
-        )
+    # Both insertions are made in one pass: find the anchors in the original
+    # content, then splice the instruments before ENDCIRCUIT and their
+    # connections before the first WIRE section's ENDWIRE
+    inserts = []
+    end_idx = dsn_content.find("ENDCIRCUIT")
+    if end_idx != -1:
+        inserts.append((end_idx, f"{logic_analyzer}\n{uart_terminal}\n"))
+    wire_idx = dsn_content.find("WIRE")
+    if wire_idx != -1:
+        endwire_idx = dsn_content.find("ENDWIRE", wire_idx + len("WIRE"))
+        if endwire_idx != -1:
+            inserts.append((endwire_idx, f"{uart_connections}\n{logic_analyzer_connections}\n"))
+    
+    if not inserts:
+        return dsn_content
+    
+    parts = []
+    pos = 0
+    for idx, text in sorted(inserts):
+        parts.append(dsn_content[pos:idx])
+        parts.append(text)
+        pos = idx
+    parts.append(dsn_content[pos:])
+    dsn_content = "".join(parts)
     
     return dsn_content
 
@@ -356,7 +371,10 @@ def main():
     args = parse_args()
     
     try:
-        netlist = json.loads(args.netlist)
+        if args.netlist_stdin:
+            netlist = json.loads(sys.stdin.buffer.read())
+        else:
+            netlist = json.loads(args.netlist)
         
         success = update_proteus_design(
             args.template,
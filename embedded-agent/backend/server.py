@@ -2,43 +2,193 @@
 FastAPI server for the 8051 embedded system design agent.
 """
 
+import asyncio
+import email.utils
+import functools
+import hashlib
 import os
 import json
-from typing import Dict, List, Any, Optional
+import mimetypes
+import queue
+import shutil
+import threading
+import traceback
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 
+# orjson is optional; ORJSONResponse needs it, so without it responses use JSONResponse
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _dumps(obj: Any) -> str:
+    """Serialize a stream message as compact JSON, using orjson when available."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
 # Import the agent
-from agent.main_agent import EmbeddedDesignAgent
+from agent.main_agent import EmbeddedDesignAgent, create_llm, format_error_message
+from task_store import (
+    cache_result,
+    create_task_record,
+    finish_task,
+    get_cached_result,
+    get_local_task,
+    get_task,
+    new_task_id,
+    redis_client,
+    update_task,
+)
+
 
+# Response class for JSON endpoints
+APIResponse = ORJSONResponse if HAS_ORJSON else JSONResponse
 
 # Initialize FastAPI app
 app = FastAPI(
     title="8051 Embedded System Design Agent API",
     description="API for automating the design of 8051 embedded systems",
     version="1.0.0",
+    default_response_class=APIResponse,
 )
 
-# Configure CORS
+# Configure CORS. Origins come from a comma-separated ALLOWED_ORIGINS (the
+# frontend's dev server by default); the API uses no cookies, so credentials stay
+# off. Only the methods and request headers the API uses are allowed, so preflight
+# checks are plain set lookups; ETag is exposed for conditional requests.
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins in development
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=ALLOWED_ORIGINS,
+    allow_credentials=False,
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "If-None-Match", "If-Modified-Since"],
+    expose_headers=["ETag"],
 )
 
-# Initialize the agent
-agent = EmbeddedDesignAgent(
-    openai_api_key=os.environ.get("OPENAI_API_KEY"),
-    verbose=True
-)
 
-# Track the status of design tasks
-design_tasks = {}
+class JSONGZipMiddleware:
+    """GZip-compress responses other than artifact downloads and status streams.
+    
+    Artifacts are served as stored (recompressing them on every download costs
+    CPU for little gain), and compression would buffer the event stream.
+    """
+    
+    def __init__(self, app, minimum_size: int = 1000):
+        self.app = app
+        self.gzip_app = GZipMiddleware(app, minimum_size=minimum_size)
+    
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] == "http" and not (path.startswith("/artifacts/") or path.endswith("/stream")):
+            await self.gzip_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+app.add_middleware(JSONGZipMiddleware, minimum_size=1000)
+
+# Agents run on the event loop (awaiting their LLM calls); their blocking work
+# (sync tools, agent creation, artifact copies) is submitted to this bounded pool
+# explicitly, so long designs can't starve the loop's default executor (DNS
+# lookups, to_thread) or the threadpool that serves sync endpoints and file I/O
+AGENT_WORKERS = int(os.environ.get("AGENT_WORKERS", 4))
+AGENT_EXECUTOR = ThreadPoolExecutor(max_workers=AGENT_WORKERS, thread_name_prefix="agent")
+
+
+# Pooled agents share one chat model, so concurrent tasks send their LLM calls
+# over one client's pool of kept-alive connections instead of one client each
+SHARED_LLM = create_llm(os.environ.get("OPENAI_API_KEY"))
+
+
+def _create_agent() -> EmbeddedDesignAgent:
+    """Initialize an agent that uses the shared chat model."""
+    return EmbeddedDesignAgent(
+        verbose=True,
+        llm=SHARED_LLM,
+        tool_executor=AGENT_EXECUTOR
+    )
+
+
+# Idle agents. Each task checks one out, so concurrent designs never share
+# conversation memory; only the AGENT_WORKERS task workers run agents, so at
+# most AGENT_WORKERS agents are ever created. The first is built at import so a
+# misconfigured server fails on startup.
+AGENT_POOL: "queue.SimpleQueue[EmbeddedDesignAgent]" = queue.SimpleQueue()
+AGENT_POOL.put(_create_agent())
+
+# Each task's agent run writes its outputs to its own directory under here, so
+# concurrent runs never overwrite (or collect) each other's files
+TASK_OUTPUT_DIR = os.path.join("backend", "outputs", "tasks")
+
+# Artifacts of finished runs are copied here, each into a directory named by its
+# content hash, so a copy never changes once written (re-runs and other requests
+# with the same output reuse it) and cached results can serve it indefinitely
+RESULT_CACHE_DIR = os.path.join("backend", "outputs", "cache")
+
+# One event per task with an open stream; a task update sets it to wake the
+# streams. Events are dropped once no stream holds them.
+TASK_EVENTS: "weakref.WeakValueDictionary[str, asyncio.Event]" = weakref.WeakValueDictionary()
+# Streams also re-read the task this often, to see updates made by other workers
+STREAM_POLL_SECONDS = 2.0
+
+# Accepted tasks wait in a bounded queue for one of AGENT_WORKERS worker
+# coroutines; POST /design answers 503 once TASK_QUEUE_SIZE tasks are waiting.
+# The queue is created on startup so it belongs to the server's event loop.
+TASK_QUEUE_SIZE = int(os.environ.get("TASK_QUEUE_SIZE", 64))
+task_queue: "Optional[asyncio.Queue]" = None
+_task_workers: List[asyncio.Task] = []
+
+# Agent runs that fail transiently (rate limits, network errors) are retried up
+# to TASK_MAX_RETRIES times, after RETRY_BASE_DELAY_SECONDS doubling per retry
+TASK_MAX_RETRIES = int(os.environ.get("TASK_MAX_RETRIES", 2))
+RETRY_BASE_DELAY_SECONDS = 5.0
+# Each agent run is cancelled after this long
+TASK_TIMEOUT_SECONDS = float(os.environ.get("TASK_TIMEOUT_SECONDS", 1800))
+SHUTDOWN_ERROR = "Server shut down before the task finished"
+
+
+async def run_pooled_agent(request: str, output_dir: str) -> Dict[str, Any]:
+    """Run a request on an idle agent from the pool (creating one if none is idle).
+    
+    The run writes its outputs to output_dir, which is emptied first, so the
+    artifacts it returns are its own. The agent goes back to the pool only if
+    the run completed; a cancelled one is dropped.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        agent = AGENT_POOL.get_nowait()
+    except queue.Empty:
+        agent = await loop.run_in_executor(AGENT_EXECUTOR, _create_agent)
+    # Clear what an earlier attempt of the same task left behind
+    await loop.run_in_executor(AGENT_EXECUTOR, shutil.rmtree, output_dir, True)
+    agent.set_output_dir(output_dir)
+    try:
+        result = await agent.arun(request)
+    except asyncio.CancelledError:
+        # Timed out or shut down mid-run: the compiler's and simulator's
+        # subprocesses are killed with the run, but a sync tool (the knowledge
+        # base) may still be running on AGENT_EXECUTOR, so the agent must not
+        # serve another task
+        print("Discarding agent cancelled mid-run; its tool thread may still be running")
+        raise
+    AGENT_POOL.put(agent)
+    return result
 
 
 class DesignRequest(BaseModel):
@@ -68,55 +218,112 @@ async def root():
     return {"message": "8051 Embedded System Design Agent API"}
 
 
+@app.on_event("startup")
+async def start_task_workers():
+    """Create the task queue and start the workers that drain it."""
+    global task_queue
+    task_queue = asyncio.Queue(maxsize=TASK_QUEUE_SIZE)
+    for _ in range(AGENT_WORKERS):
+        _task_workers.append(asyncio.create_task(_task_worker()))
+
+
+@app.on_event("shutdown")
+async def stop_task_workers():
+    """Stop the task workers, failing the tasks they can no longer run."""
+    for worker in _task_workers:
+        worker.cancel()
+    await asyncio.gather(*_task_workers, return_exceptions=True)
+    _task_workers.clear()
+    
+    # Tasks still queued would otherwise stay pending in a shared store forever
+    while not task_queue.empty():
+        task_id, _ = task_queue.get_nowait()
+        await finish_task(task_id, status="failed", error=SHUTDOWN_ERROR)
+
+
+async def _task_worker():
+    """Run queued design tasks one at a time."""
+    while True:
+        task_id, request = await task_queue.get()
+        try:
+            await run_design_task(task_id, request)
+        except asyncio.CancelledError:
+            # Shutdown interrupted the task; record that instead of leaving it running
+            await finish_task(task_id, status="failed", error=SHUTDOWN_ERROR)
+            raise
+        except Exception:
+            # run_design_task records its own failures; this only catches the
+            # task store itself failing, which must not stop the worker
+            traceback.print_exc()
+        finally:
+            task_queue.task_done()
+
+
 @app.post("/design", response_model=DesignResponse)
-async def create_design(request: DesignRequest, background_tasks: BackgroundTasks):
+async def create_design(request: DesignRequest):
     """Create a new design task."""
+    if task_queue.full():
+        raise HTTPException(status_code=503, detail="Server busy, try again later")
+    
     # Generate a task ID
-    task_id = f"task_{len(design_tasks) + 1}"
+    task_id = await new_task_id()
     
     # Initialize task status
-    design_tasks[task_id] = {
-        "status": "pending",
-        "request": request.request,
-        "response": None,
-        "artifacts": None,
-        "error": None
-    }
+    await create_task_record(task_id, request.request)
     
-    # Run the design task in the background
-    background_tasks.add_task(run_design_task, task_id, request.request)
+    # Queue the design task for a worker
+    try:
+        task_queue.put_nowait((task_id, request.request))
+    except asyncio.QueueFull:
+        # The queue filled up while the task was being stored
+        await finish_task(task_id, status="failed", error="Server busy, try again later")
+        raise HTTPException(status_code=503, detail="Server busy, try again later")
     
     return DesignResponse(
         task_id=task_id,
         status="pending",
-        message="Design task created and running in the background"
+        message="Design task created and queued for processing"
     )
 
 
 @app.get("/design/{task_id}", response_model=DesignStatus)
 async def get_design_status(task_id: str):
     """Get the status of a design task."""
-    if task_id not in design_tasks:
+    # Kept async so polls are answered on the event loop (a plain def endpoint
+    # would be dispatched to the threadpool on every call); the in-process store
+    # is read directly, without creating a coroutine per poll
+    task = get_local_task(task_id) if redis_client is None else await get_task(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = design_tasks[task_id]
+    # The task is written by the server itself, so it is encoded as-is rather
+    # than validated through DesignStatus on every poll
+    return APIResponse(_task_status(task_id, task))
+
+
+@app.get("/design/{task_id}/stream")
+async def stream_design_status(task_id: str):
+    """Stream the status of a design task as Server-Sent Events, one per change."""
+    if await get_task(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
     
-    return DesignStatus(
-        task_id=task_id,
-        status=task["status"],
-        response=task.get("response"),
-        artifacts=task.get("artifacts"),
-        error=task.get("error")
+    return StreamingResponse(
+        _status_events(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
     )
 
 
 @app.get("/artifacts/{task_id}/{artifact_type}")
-async def get_artifact(task_id: str, artifact_type: str):
-    """Get a specific artifact from a design task."""
-    if task_id not in design_tasks:
-        raise HTTPException(status_code=404, detail="Task not found")
+async def get_artifact(task_id: str, artifact_type: str, request: Request):
+    """Get a specific artifact from a design task.
     
-    task = design_tasks[task_id]
+    A client that sends back the artifact's ETag in If-None-Match (or a date
+    in If-Modified-Since) gets an empty 304 while the file is unchanged.
+    """
+    task = await get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
     
     if task["status"] != "completed":
         raise HTTPException(status_code=400, detail="Task not completed")
@@ -129,47 +336,237 @@ async def get_artifact(task_id: str, artifact_type: str):
     
     file_path = task["artifacts"][artifact_type]
     
-    return FileResponse(file_path)
+    # Use the type and content ETag recorded when the task finished, if any;
+    # a matching ETag is answered before touching the file at all
+    meta = (task.get("artifact_meta") or {}).get(artifact_type)
+    if_none_match = request.headers.get("if-none-match")
+    if meta is not None and if_none_match == meta["etag"]:
+        return Response(status_code=304, headers={"ETag": meta["etag"]})
+    
+    try:
+        # Artifacts with metadata are content-addressed cache copies, which never
+        # change, so their stat can be memoized; other files are stat'ed each time
+        stat_result = _artifact_stat(file_path) if meta is not None else os.stat(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Artifact {artifact_type} file is missing")
+    
+    # If-Modified-Since only applies when the client sent no If-None-Match
+    if if_none_match is None and _not_modified_since(request.headers.get("if-modified-since"), stat_result):
+        return Response(status_code=304, headers={"ETag": meta["etag"]} if meta is not None else None)
+    
+    if meta is None:
+        return FileResponse(file_path, stat_result=stat_result)
+    return FileResponse(
+        file_path,
+        media_type=meta["media_type"],
+        headers={"ETag": meta["etag"]},
+        stat_result=stat_result
+    )
+
+
+def _not_modified_since(if_modified_since: Optional[str], stat_result: os.stat_result) -> bool:
+    """Whether a file is unchanged since an If-Modified-Since date."""
+    if if_modified_since is None:
+        return False
+    try:
+        since = email.utils.parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        # Unparseable dates are ignored, as HTTP requires
+        return False
+    # Last-Modified has whole-second precision
+    return int(stat_result.st_mtime) <= since.timestamp()
+
 
+@functools.lru_cache(maxsize=1024)
+def _artifact_stat(path: str) -> os.stat_result:
+    """Stat a result-cache copy of an artifact (copies are never rewritten, so this never goes stale)."""
+    return os.stat(path)
 
-def run_design_task(task_id: str, request: str):
+
+def _task_status(task_id: str, task: Dict[str, Any]) -> Dict[str, Any]:
+    """Public status fields of a task (the fields of DesignStatus)."""
+    return {
+        "task_id": task_id,
+        "status": task["status"],
+        "response": task.get("response"),
+        "artifacts": task.get("artifacts"),
+        "error": task.get("error")
+    }
+
+
+async def _status_events(task_id: str):
+    """Yield an SSE message whenever the task changes, until it finishes."""
+    version = None
+    while True:
+        # Take the event before reading, so an update in between still wakes us
+        event = TASK_EVENTS.get(task_id)
+        if event is None:
+            event = TASK_EVENTS[task_id] = asyncio.Event()
+        
+        task = await get_task(task_id)
+        if task is None:
+            return
+        
+        if task.get("version") != version:
+            version = task.get("version")
+            yield f"data: {_dumps(_task_status(task_id, task))}\n\n"
+        
+        if task["status"] in ("completed", "failed"):
+            return
+        
+        try:
+            await asyncio.wait_for(event.wait(), STREAM_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _notify_task(task_id: str):
+    """Wake the streams of a task after it was updated."""
+    event = TASK_EVENTS.pop(task_id, None)
+    if event is not None:
+        event.set()
+
+
+def _request_key(request: str) -> str:
+    """Cache key for a request; case and whitespace don't change the key."""
+    normalized = " ".join(request.lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cache_artifacts(artifacts: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, Dict[str, Any]]]:
+    """Copy a run's artifacts into content-addressed cache directories.
+    
+    Returns the copies' paths and, per artifact, the metadata get_artifact
+    serves them with (media type, size and a content-hash ETag).
+    """
+    cached = {}
+    meta = {}
+    for name, path in artifacts.items():
+        with open(path, "rb") as f:
+            content = f.read()
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        cache_dir = os.path.join(RESULT_CACHE_DIR, digest)
+        cached_path = os.path.join(cache_dir, os.path.basename(path))
+        if not os.path.exists(cached_path):
+            # Written under a temporary name and renamed, so readers never see a partial copy
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, cached_path)
+        
+        cached[name] = cached_path
+        meta[name] = {
+            "media_type": mimetypes.guess_type(cached_path)[0] or "text/plain",
+            "size": len(content),
+            "etag": f'"{digest}"'
+        }
+    return cached, meta
+
+
+async def _run_agent_with_retries(request: str, output_dir: str) -> Dict[str, Any]:
+    """Run a request on the agent pool, retrying transient failures with backoff."""
+    for attempt in range(TASK_MAX_RETRIES + 1):
+        result = await asyncio.wait_for(run_pooled_agent(request, output_dir), TASK_TIMEOUT_SECONDS)
+        if result["success"] or not result.get("transient") or attempt == TASK_MAX_RETRIES:
+            return result
+        # The worker keeps its slot while it waits, which also eases off the rate limit
+        await asyncio.sleep(RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+
+
+async def run_design_task(task_id: str, request: str):
     """Run a design task."""
     try:
         # Update status to running
-        design_tasks[task_id]["status"] = "running"
+        await update_task(task_id, status="running")
+        _notify_task(task_id)
         
-        # Run the agent
-        result = agent.run(request)
+        # A request seen before is answered from the cache without the agent
+        request_key = _request_key(request)
+        cached = await get_cached_result(request_key)
+        if cached is not None:
+            await finish_task(
+                task_id,
+                status="completed",
+                response=cached["response"],
+                artifacts=cached["artifacts"],
+                artifact_meta=cached.get("artifact_meta")
+            )
+            return
+        
+        # Run the agent on a pooled agent, in the task's own output directory
+        result = await _run_agent_with_retries(request, os.path.join(TASK_OUTPUT_DIR, task_id))
         
         if result["success"]:
+            artifacts = result["artifacts"]
+            try:
+                artifacts, artifact_meta = await asyncio.get_running_loop().run_in_executor(
+                    AGENT_EXECUTOR, _cache_artifacts, artifacts
+                )
+            except OSError:
+                # Artifacts that can't be copied leave the result uncached
+                artifact_meta = None
+            else:
+                await cache_result(request_key, {
+                    "response": result["response"],
+                    "artifacts": artifacts,
+                    "artifact_meta": artifact_meta
+                })
+            
             # Update status to completed
-            design_tasks[task_id].update({
-                "status": "completed",
-                "response": result["response"],
-                "artifacts": result["artifacts"]
-            })
+            await finish_task(
+                task_id,
+                status="completed",
+                response=result["response"],
+                artifacts=artifacts,
+                artifact_meta=artifact_meta
+            )
         else:
             # Update status to failed
-            design_tasks[task_id].update({
-                "status": "failed",
-                "error": result["error"]
-            })
+            await finish_task(
+                task_id,
+                status="failed",
+                error=result["error"]
+            )
+    
+    except asyncio.TimeoutError:
+        await finish_task(
+            task_id,
+            status="failed",
+            error=f"Design timed out after {TASK_TIMEOUT_SECONDS:.0f}s"
+        )
     
     except Exception as e:
         # Update status to failed
-        design_tasks[task_id].update({
-            "status": "failed",
-            "error": str(e)
-        })
+        await finish_task(
+            task_id,
+            status="failed",
+            error=format_error_message(e)
+        )
+    
+    finally:
+        _notify_task(task_id)
 
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
     
+    # Reload only in development; it is incompatible with multiple workers.
+    # More than one worker needs REDIS_URL so they share task state, and each
+    # worker runs its own agent pool, so a single worker is the default.
+    dev_mode = os.environ.get("DEV") == "1"
+    workers = 1 if dev_mode else int(os.environ.get("WEB_CONCURRENCY", 1))
+    if workers > 1 and redis_client is None:
+        raise SystemExit("WEB_CONCURRENCY > 1 needs REDIS_URL (and redis installed) to share task state")
+    
     # Run the server
     uvicorn.run(
         "server:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=dev_mode,
+        workers=workers,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11"
     )
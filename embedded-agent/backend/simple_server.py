@@ -2,18 +2,20 @@
 FastAPI server for the 8051 embedded system design agent.
 """
 
+import asyncio
 import os
 import json
 import traceback
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
 # Import the agent
 from agent.main_agent import EmbeddedDesignAgent
+from task_store import create_task_record, finish_task, get_task, redis_client, task_etag, update_task
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -31,20 +33,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Track the status of design tasks
-design_tasks = {}
+# TEST_MODE=1 completes every design task with TEST_MODE_RESULT instead of
+# running the agent, so the API and frontend can be exercised without OpenAI
+TEST_MODE = os.environ.get("TEST_MODE") == "1"
+TEST_MODE_RESULT = {
+    "success": True,
+    "response": "Test mode: no design was generated.",
+    "artifacts": {}
+}
+
+# Running design tasks. The event loop only keeps weak references to tasks, so
+# each one is held here until it finishes.
+_BG_TASKS: Set[asyncio.Task] = set()
+
+# The agent is built on the first design task rather than at import, so the
+# server answers (and each worker starts) without waiting on the knowledge base
+_agent: Optional[EmbeddedDesignAgent] = None
+_agent_lock: Optional[asyncio.Lock] = None
+
+if TEST_MODE:
+    print("TEST_MODE enabled: design tasks return a canned result")
 
-# Initialize the agent with OpenAI API key from environment variable
-try:
-    agent = EmbeddedDesignAgent(
-        openai_api_key=os.environ.get("OPENAI_API_KEY"),
-        verbose=True
-    )
-    print("Agent initialized successfully")
-except Exception as e:
-    print(f"Error initializing agent: {str(e)}")
-    print(traceback.format_exc())
-    agent = None
+
+async def get_agent() -> EmbeddedDesignAgent:
+    """Return the shared agent, initializing it with the OpenAI API key from the environment on first use."""
+    global _agent, _agent_lock
+    if _agent is not None:
+        return _agent
+    
+    # Created here so the lock belongs to the server's running event loop
+    if _agent_lock is None:
+        _agent_lock = asyncio.Lock()
+    async with _agent_lock:
+        if _agent is None:
+            try:
+                _agent = await asyncio.to_thread(
+                    EmbeddedDesignAgent,
+                    openai_api_key=os.environ.get("OPENAI_API_KEY"),
+                    verbose=True
+                )
+                print("Agent initialized successfully")
+            except Exception as e:
+                print(f"Error initializing agent: {str(e)}")
+                print(traceback.format_exc())
+                raise
+    return _agent
 
 class DesignRequest(BaseModel):
     """Model for design requests."""
@@ -74,30 +107,19 @@ async def root():
 
 
 @app.post("/design")
-async def create_design(request: DesignRequest, background_tasks: BackgroundTasks):
+async def create_design(request: DesignRequest):
     """Create a new design task."""
-    if agent is None:
-        return DesignResponse(
-            task_id="error",
-            status="failed",
-            message="Agent not initialized. Check server logs for details."
-        )
-    
     # Generate a task ID
     import uuid
     task_id = str(uuid.uuid4())
     
     # Initialize task status
-    design_tasks[task_id] = {
-        "status": "pending",
-        "request": request.request,
-        "response": None,
-        "artifacts": None,
-        "error": None
-    }
+    await create_task_record(task_id, request.request)
     
     # Run the design task in the background
-    background_tasks.add_task(run_design_task, task_id, request.request)
+    task = asyncio.create_task(run_design_task(task_id, request.request))
+    _BG_TASKS.add(task)
+    task.add_done_callback(_BG_TASKS.discard)
     
     return DesignResponse(
         task_id=task_id,
@@ -107,16 +129,25 @@ async def create_design(request: DesignRequest, background_tasks: BackgroundTask
 
 
 @app.get("/design/{task_id}")
-async def get_design_status(task_id: str):
-    """Get the status of a design task."""
-    if task_id not in design_tasks:
+async def get_design_status(task_id: str, request: Request, response: Response):
+    """Get the status of a design task.
+    
+    Responses carry an ETag, so a poller that sends it back in If-None-Match
+    gets an empty 304 until the task changes.
+    """
+    task = await get_task(task_id)
+    if task is None:
         return DesignStatus(
             task_id=task_id,
             status="failed",
             error="Task not found"
         )
     
-    task = design_tasks[task_id]
+    etag = task_etag(task_id, task)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     
     return DesignStatus(
         task_id=task_id,
@@ -130,11 +161,10 @@ async def get_design_status(task_id: str):
 @app.get("/artifacts/{task_id}/{artifact_type}")
 async def get_artifact(task_id: str, artifact_type: str):
     """Get a specific artifact from a design task."""
-    if task_id not in design_tasks:
+    task = await get_task(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = design_tasks[task_id]
-    
     if task["status"] != "completed":
         raise HTTPException(status_code=400, detail="Task not completed")
     
@@ -152,57 +182,82 @@ async def get_artifact(task_id: str, artifact_type: str):
     return FileResponse(file_path)
 
 
-def run_design_task(task_id: str, request: str):
+async def run_design_task(task_id: str, request: str):
     """Run a design task."""
-    if agent is None:
-        design_tasks[task_id].update({
-            "status": "failed",
-            "error": "Agent not initialized. Check server logs for details."
-        })
-        return
-    
     try:
         # Update status to running
-        design_tasks[task_id]["status"] = "running"
+        await update_task(task_id, status="running")
         print(f"Processing task {task_id} with request: {request}")
         
-        # Run the agent
-        result = agent.run(request)
+        # Run the agent; compilation awaits SDCC instead of holding a thread
+        if TEST_MODE:
+            result = TEST_MODE_RESULT
+        else:
+            try:
+                agent = await get_agent()
+            except Exception:
+                await finish_task(
+                    task_id,
+                    status="failed",
+                    error="Agent not initialized. Check server logs for details."
+                )
+                return
+            result = await agent.arun(request)
         print(f"Agent result for task {task_id}: {result}")
         
         if result.get("success", False):
             # Update status to completed
-            design_tasks[task_id].update({
-                "status": "completed",
-                "response": result.get("response", "Task completed successfully but no response was provided."),
-                "artifacts": result.get("artifacts", {})
-            })
+            await finish_task(
+                task_id,
+                status="completed",
+                response=result.get("response", "Task completed successfully but no response was provided."),
+                artifacts=result.get("artifacts", {})
+            )
             print(f"Task {task_id} completed successfully")
         else:
             # Update status to failed
-            design_tasks[task_id].update({
-                "status": "failed",
-                "error": result.get("error", "Unknown error occurred")
-            })
+            await finish_task(
+                task_id,
+                status="failed",
+                error=result.get("error", "Unknown error occurred")
+            )
             print(f"Task {task_id} failed: {result.get('error', 'Unknown error')}")
     
     except Exception as e:
         print(f"Exception in task {task_id}: {str(e)}")
         print(traceback.format_exc())
         # Update status to failed
-        design_tasks[task_id].update({
-            "status": "failed",
-            "error": str(e)
-        })
+        await finish_task(
+            task_id,
+            status="failed",
+            error=str(e)
+        )
 
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
     
+    # Reload only in development; it is incompatible with multiple workers.
+    # Workers only share task state through Redis, so without REDIS_URL a task
+    # created by one worker would be unknown to the others: run a single worker.
+    dev_mode = os.environ.get("DEV") == "1"
+    if dev_mode:
+        workers = 1
+    elif redis_client is None:
+        workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+        if workers > 1:
+            raise SystemExit("WEB_CONCURRENCY > 1 needs REDIS_URL (and redis installed) to share task state")
+    else:
+        workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    
     # Run the server
     uvicorn.run(
         "simple_server:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=dev_mode,
+        workers=workers,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11"
     ) 
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Design task state (and cached design results) shared by the API servers.
+
+With REDIS_URL set (and redis installed), each task is a hash at task:{id},
+in-flight ids live in the running_tasks sorted set (scored by creation time)
+and finished ids are pushed onto the capped finished_tasks list, so several
+workers share one view of the tasks. Otherwise the tasks live in this process.
+Either way finished tasks expire; in Redis, so do tasks a crashed worker left
+in flight, once they are TASK_TTL_SECONDS old.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+# Redis is optional; without it task state stays in this process
+try:
+    import redis.asyncio as aioredis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+# cachetools bounds the in-process task store; without it the store is a plain dict
+try:
+    from cachetools import TTLCache
+    HAS_CACHETOOLS = True
+except ImportError:
+    HAS_CACHETOOLS = False
+
+REDIS_URL = os.environ.get("REDIS_URL")
+# Connections kept in the client's pool (one per concurrently awaited command)
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 64))
+TASK_TTL_SECONDS = 86400
+RUNNING_TASKS_KEY = "running_tasks"
+FINISHED_TASKS_KEY = "finished_tasks"
+# Most recent finished ids kept in FINISHED_TASKS_KEY
+FINISHED_TASKS_LIMIT = 1000
+TASK_SEQ_KEY = "task:seq"
+# Task fields stored as JSON in the Redis hash
+JSON_TASK_FIELDS = ("artifacts", "artifact_meta")
+
+# Without Redis, finished tasks are dropped LOCAL_TASK_TTL_SECONDS after they
+# finish (or earlier once TASK_CACHE_SIZE finished tasks are stored)
+TASK_CACHE_SIZE = int(os.environ.get("TASK_CACHE_SIZE", 1024))
+LOCAL_TASK_TTL_SECONDS = 3600
+
+# Successful results are kept per normalized request so repeated requests skip
+# the agent; in-process this holds at most RESULT_CACHE_SIZE results
+RESULT_CACHE_TTL_SECONDS = 86400
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 256))
+
+if HAS_REDIS and REDIS_URL:
+    redis_client = aioredis.from_url(
+        REDIS_URL, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS
+    )
+else:
+    redis_client = None
+# Tasks still in flight are never evicted; finish_task moves them to design_tasks
+running_tasks: Dict[str, Dict[str, Any]] = {}
+if HAS_CACHETOOLS:
+    design_tasks = TTLCache(maxsize=TASK_CACHE_SIZE, ttl=LOCAL_TASK_TTL_SECONDS)
+else:
+    design_tasks = {}
+# TTLCache evicts on access, so every read and write goes through this lock
+design_tasks_lock = threading.Lock()
+# Only touched from the event loop, so it needs no lock
+if HAS_CACHETOOLS:
+    result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL_SECONDS)
+else:
+    result_cache = {}
+
+
+def _task_key(task_id: str) -> str:
+    return f"task:{task_id}"
+
+
+def _result_key(request_key: str) -> str:
+    return f"agentcache:{request_key}"
+
+
+def _encode_task(fields: Dict[str, Any]) -> Dict[str, str]:
+    """Flatten task fields into a Redis hash mapping (None fields are left out)."""
+    encoded = {}
+    for name, value in fields.items():
+        if value is None:
+            continue
+        encoded[name] = json.dumps(value) if name in JSON_TASK_FIELDS else str(value)
+    return encoded
+
+
+def _updated(task: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    # Build a new dict rather than mutate, so readers never see a half-updated task
+    return {**task, **fields, "version": task.get("version", 0) + 1}
+
+
+def task_etag(task_id: str, task: Dict[str, Any]) -> str:
+    """ETag for a task's status; every update bumps the task's version."""
+    return f'"{task_id}-{task.get("version", 0)}"'
+
+
+async def create_task_record(task_id: str, request: str):
+    """Store a new pending task."""
+    if redis_client is None:
+        with design_tasks_lock:
+            running_tasks[task_id] = {
+                "status": "pending",
+                "request": request,
+                "response": None,
+                "artifacts": None,
+                "error": None,
+                "version": 0
+            }
+        return
+    
+    now = time.time()
+    key = _task_key(task_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={"status": "pending", "request": request, "version": 0})
+        # Expire even if no worker ever finishes the task (finish_task restarts the clock)
+        pipe.expire(key, TASK_TTL_SECONDS)
+        pipe.zadd(RUNNING_TASKS_KEY, {task_id: now})
+        # Drop ids whose tasks have expired unfinished
+        pipe.zremrangebyscore(RUNNING_TASKS_KEY, "-inf", now - TASK_TTL_SECONDS)
+        await pipe.execute()
+
+
+async def update_task(task_id: str, **fields):
+    """Update fields of a task that is still in flight."""
+    if redis_client is None:
+        with design_tasks_lock:
+            running_tasks[task_id] = _updated(running_tasks.get(task_id, {}), fields)
+        return
+    
+    key = _task_key(task_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping=_encode_task(fields))
+        pipe.hincrby(key, "version", 1)
+        await pipe.execute()
+
+
+async def finish_task(task_id: str, **fields):
+    """Record the final state of a task and start its expiry clock."""
+    if redis_client is None:
+        # Inserting into design_tasks starts the finished task's TTL
+        with design_tasks_lock:
+            design_tasks[task_id] = _updated(running_tasks.pop(task_id, {}), fields)
+        return
+    
+    key = _task_key(task_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping=_encode_task(fields))
+        pipe.hincrby(key, "version", 1)
+        pipe.zrem(RUNNING_TASKS_KEY, task_id)
+        pipe.lpush(FINISHED_TASKS_KEY, task_id)
+        pipe.ltrim(FINISHED_TASKS_KEY, 0, FINISHED_TASKS_LIMIT - 1)
+        pipe.expire(key, TASK_TTL_SECONDS)
+        await pipe.execute()
+
+
+def get_local_task(task_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch a task from the in-process store, or None if it is unknown (or has expired)."""
+    with design_tasks_lock:
+        task = running_tasks.get(task_id)
+        return task if task is not None else design_tasks.get(task_id)
+
+
+async def get_task(task_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch a task, or None if it is unknown (or has expired)."""
+    if redis_client is None:
+        return get_local_task(task_id)
+    
+    task = await redis_client.hgetall(_task_key(task_id))
+    if not task:
+        return None
+    for name in JSON_TASK_FIELDS:
+        if name in task:
+            task[name] = json.loads(task[name])
+    return task
+
+
+async def new_task_id() -> str:
+    """Allocate an id for a new task."""
+    if redis_client is None:
+        # Each worker has its own store, so a per-process counter would hand out
+        # the same ids in every worker (and again after a restart); a random id
+        # can't collide or be guessed
+        return f"task_{uuid.uuid4().hex}"
+    
+    # INCR is atomic, so sequential ids stay unique across workers
+    return f"task_{await redis_client.incr(TASK_SEQ_KEY)}"
+
+
+async def get_cached_result(request_key: str) -> Optional[Dict[str, Any]]:
+    """Fetch the cached result for a request key, or None on a miss."""
+    if redis_client is None:
+        return result_cache.get(request_key)
+    
+    cached = await redis_client.get(_result_key(request_key))
+    return json.loads(cached) if cached is not None else None
+
+
+async def cache_result(request_key: str, result: Dict[str, Any]):
+    """Cache a result ({"response", "artifacts", "artifact_meta"}) under a request key."""
+    if redis_client is None:
+        result_cache[request_key] = result
+        return
+    
+    await redis_client.setex(_result_key(request_key), RESULT_CACHE_TTL_SECONDS, json.dumps(result))